@@ -1,15 +1,20 @@
 import sys
+import functools
 
 import argparse
 from matplotlib import pyplot as plt
 
+from tools import data, catalog, profiling, render
+from app import batch, service
 from app.models import SICImage as SIC, LMImage as LM, TEMPImage as TEMP, \
     SSTImage as SST, NPRImage as NPR, NGRImage as NGR, IbandImage as IBAND, \
     MbandImage as MBAND, FcImage as FC
 from app.reports.analysis import hist_match, day_image, histmatch_plot, \
     single_histmatch_analysis
 from app.reports.color_report import color_clusters, blue_channels, rgb, \
-    find_water
+    find_water, CROP
+from app.reports.pipeline import collect as granule_metrics
+from app.reports.classification import classify_archive, load_centroids
 from app.reports.sic_report import time_series, land_sic_overlap_timeseries, \
     show_day_images_by_instrument, unified_day_image, surface_analysis, \
     silhoutte, distribution, land_sic_overlap
@@ -95,6 +100,25 @@ def main():
         '-water', action='store_true', dest='water', default=False,
         help="Find water using the 3 bands from mbands")
 
+    parser.add_argument(
+        '--scene', action='store_true', dest='scene', default=False,
+        help="Cluster the whole scene instead of the crop window")
+
+    parser.add_argument(
+        '--seed', action='store', dest='seed', type=int,
+        help="Seed of the k-means clustering")
+
+    parser.add_argument(
+        '--centroids', action='store', dest='centroids',
+        help="Save the k-means centroids of -c or -water in this .npz file")
+
+    parser.add_argument(
+        '--classify', action='store', dest='classify',
+        help="Label every pixel of -img, or of every granule of the "
+             "instrument, with the centroids saved in this .npz file. Run "
+             "'python -m tools.ingest' first so the granules are read tile "
+             "by tile from the store")
+
     # General args
     # ============
     parser.add_argument('--sensor', action='store', dest='sensor',
@@ -103,11 +127,86 @@ def main():
         '-img', action='store', dest='img', help="Image to be matched")
     parser.add_argument(
         '-img2', action='store', dest='img2', help="Image Template")
+    parser.add_argument(
+        '--start', action='store', dest='start',
+        help="First granule time of a time series, e.g. 2015_336_0600")
+    parser.add_argument(
+        '--end', action='store', dest='end',
+        help="Last granule time of a time series, e.g. 2015_336_1800")
+    parser.add_argument(
+        '--levels', action='store', dest='levels', type=levels_arg,
+        help="Ice concentration levels of the SIC time series extent curves, "
+             "e.g. 15,30,40,50,70,85")
+    parser.add_argument(
+        '--workers', action='store', dest='workers', type=int, default=1,
+        help="Number of processes used to compute the granules")
+
+    # Batch
+    # =====
+    parser.add_argument(
+        '--batch', action='store', dest='batch',
+        help="Run the jobs of this JSON file in one process, see app/batch.py."
+             " Figures and the manifest go to --output (default: batch)")
+
+    # Service
+    # =======
+    parser.add_argument(
+        '--serve', action='store', dest='serve', type=int, metavar='PORT',
+        help="Serve the granule analyses as HTTP/JSON on this port, see "
+             "app/service.py")
+    parser.add_argument(
+        '--host', action='store', dest='host', default='127.0.0.1',
+        help="Address the service listens on (default: 127.0.0.1)")
+
+    # Profiling
+    # =========
+    parser.add_argument(
+        '--profile', action='store', dest='profile', nargs='?', const='',
+        help="Print the time, calls, bytes decoded and peak memory of every "
+             "stage at exit, and save them as JSON in the optional file")
+
+    # Output
+    # ======
+    parser.add_argument(
+        '--output', '-o', action='store', dest='output',
+        help="Save the figures in this directory instead of showing them. "
+             "Without -img single image reports run for every granule of "
+             "the instrument")
+    parser.add_argument(
+        '--format', action='store', dest='format', default='png',
+        help="File format of the saved figures, png or pdf")
 
     args = parser.parse_args()
 
+    if args.profile is not None:
+        profiling.enable(args.profile or None)
+
+    if args.batch:
+        manifest = batch.run(batch.load_jobs(args.batch),
+                             args.output or 'batch', args.workers,
+                             args.format)
+        sys.exit(1 if manifest['failed'] else 0)
+
+    if args.serve:
+        service.serve(args.serve, args.host)
+        return
+
+    if args.output:
+        render.configure(args.output, args.format)
+
+    if args.classify:
+        classify_report(args.classify, args.img, args.instrument, args.workers)
+        return
+
+    action = granule_action(args)
+    if args.output and action is not None and not args.img:
+        render_archive(action, args.instrument, args.workers)
+        return
+
     if args.sic:
-        sic_report(args.instrument.lower())
+        sic_report(args.instrument.lower(), workers=args.workers,
+                   start=date_arg(args.start), end=date_arg(args.end),
+                   levels=args.levels)
     if args.overlap:
         land_ice_overlap(args.img)
     elif args.hist:
@@ -115,7 +214,7 @@ def main():
     elif args.imgday:
         instrument_image_of_the_day(args.instrument.lower(), args.sensor)
     elif args.color:
-        color_report(args.img)
+        color_report(args.img, **cluster_args(args))
     elif args.rgb:
         show_rgb(args.img, args.sensor)
     elif args.distribution:
@@ -138,15 +237,123 @@ def main():
         single_histogram_matched(
             args.img, args.img2, args.sensor, side_plot=True)
     elif args.water:
-        show_water(args.img)
+        show_water(args.img, **cluster_args(args))
     else:
         print "Mer Mer Mer"
 
 
-def sic_report(instrument, sensor='mw_sic', interval=20):
+def granule_action(args):
+    """
+        Returns the single image report selected in args as a function of the
+        granule file name, None when the report isn't about a single image.
+    """
+    if args.overlap:
+        return land_ice_overlap
+    elif args.color:
+        return functools.partial(color_report, **cluster_args(args))
+    elif args.rgb:
+        return functools.partial(show_rgb, sensor=args.sensor)
+    elif args.distribution:
+        return functools.partial(sic_or_lm_distribution, sensor=args.sensor)
+    elif args.silhoutte:
+        return functools.partial(sic_or_lm_silhoutte, sensor=args.sensor)
+    elif args.surface:
+        return sic_surface_analysis
+    elif args.show:
+        return functools.partial(img_show, sensor=args.sensor)
+    elif args.water:
+        return functools.partial(show_water, **cluster_args(args))
+    return None
+
+
+def cluster_args(args):
+    """
+        Window and seed of the clustering reports.
+    """
+    return {'roi': None if args.scene else CROP, 'seed': args.seed,
+            'centroids_path': args.centroids}
+
+
+@profiling.timed('report')
+def classify_report(centroids_path, image=None, instrument=None, workers=1):
+    """
+        Label the pixels of image, or of every granule of the instrument, with
+        saved centroids. The labels are saved in the store of each granule.
+
+        :params:
+            :param centroids_path: string with the .npz file of the centroids
+            :param image: string with the filename of an image
+            :param workers: number of processes used for the granules
+    """
+    centroids, layers = load_centroids(centroids_path)
+
+    if image:
+        files = [image]
+    else:
+        files = catalog.files(instrument.lower() if instrument else 'both')
+
+    print "Classifying {0} granules with {1} workers".format(
+        len(files), workers)
+    for filename, counts in classify_archive(files, centroids, layers,
+                                             workers):
+        print "{0}: {1}".format(filename, ", ".join(
+            "{0} {1}".format(label, count)
+            for label, count in enumerate(counts)))
+
+
+@profiling.timed('report')
+def render_archive(action, instrument, workers=1):
+    """
+        Render a single image report for every granule of the instrument into
+        the output directory, spread across workers processes.
+    """
+    files = catalog.files(instrument.lower() if instrument else 'both')
+
+    print "Rendering {0} granules with {1} workers".format(
+        len(files), workers)
+
+    for filename, error in render.render_granules(action, files, workers):
+        if error is not None:
+            print "{0}: {1}".format(filename, error)
+
+
+def date_arg(date_str):
+    """
+        Convert a --start/--end date, 'YYYY_DDD' or 'YYYY_DDD_HHMM', to
+        seconds since the epoch.
+    """
+    if date_str is None:
+        return None
+    return data.date_timestamp(date_str)
+
+
+def levels_arg(levels_str):
+    """
+        Convert a --levels list, e.g. '15,30,40', to integer levels.
+    """
+    try:
+        levels = [int(level) for level in levels_str.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "levels must be integers separated by commas")
+    if any(not 0 <= level <= 100 for level in levels):
+        raise argparse.ArgumentTypeError("levels must be between 0 and 100")
+    return levels
+
+
+@profiling.timed('report')
+def sic_report(instrument, sensor='mw_sic', interval=20, workers=1,
+               start=None, end=None, levels=None):
     """
         :params:
             :param interval: minutes interval for unified day image
+            :param workers: number of processes used by the time series
+            :param start: seconds since the epoch of the first granule of the
+                          time series, None starts with the first one.
+            :param end: seconds since the epoch of the last granule of the
+                        time series, None ends with the last one.
+            :param levels: ice concentration levels of the extent curves,
+                           None shows the ice and other percentages.
     """
 
     print "\nRunning SIC Report"
@@ -159,13 +366,21 @@ def sic_report(instrument, sensor='mw_sic', interval=20):
         print "Invalid instrument"
         sys.exit(1)
 
+    # Decode every granule once and compute the metrics of both time series
+    # in that pass.
+    files = catalog.files(instrument, start, end)
+    metrics = ['histogram' if levels else 'sic', 'border_overlap']
+    rows = granule_metrics(files, metrics, workers)
+
     # Run the time series report
     msg = "\n{0} - SIC Percentage Changes".format(title)
 
     print msg
     time_series(
         instrument=instrument,
-        title=msg
+        title=msg,
+        rows=rows,
+        levels=levels
     )
 
     # Run the time series to show percentage variations of the Land Mask's
@@ -175,7 +390,8 @@ def sic_report(instrument, sensor='mw_sic', interval=20):
 
     land_sic_overlap_timeseries(
         instrument=instrument,
-        title=msg
+        title=msg,
+        rows=rows
     )
 
     # # Run Histogram Matching by day for each instrumenent VIRS and MODIS
@@ -190,6 +406,7 @@ def sic_report(instrument, sensor='mw_sic', interval=20):
     unified_day_image(sensor, interval)
 
 
+@profiling.timed('report')
 def land_ice_overlap(image):
     """
         :params:
@@ -203,10 +420,14 @@ def land_ice_overlap(image):
     land_sic_overlap(lm, sic)
 
 
-def color_report(image):
+@profiling.timed('report')
+def color_report(image, roi=CROP, seed=None, centroids_path=None):
     """
         :params:
             :param image: string with the filename of an image
+            :param roi: window clustered, None clusters the whole scene
+            :param seed: integer seed of the k-means
+            :param centroids_path: .npz file to save the centroids in
     """
 
     print "\nColor Report"
@@ -217,7 +438,7 @@ def color_report(image):
     mbands = MBAND(image)
 
     print "\nK-means clustering for {0}".format(image)
-    color_clusters(ibands, mbands, fc, lm)
+    color_clusters(ibands, mbands, fc, lm, roi, seed, centroids_path)
 
     print "\nBlue Channels for {0}".format(image)
     blue_channels(ibands, mbands, fc)
@@ -227,6 +448,7 @@ def color_report(image):
         rgb(img)
 
 
+@profiling.timed('report')
 def show_rgb(image, sensor):
     """
         :params:
@@ -246,17 +468,22 @@ def show_rgb(image, sensor):
     rgb(image)
 
 
-def show_water(image):
+@profiling.timed('report')
+def show_water(image, roi=CROP, seed=None, centroids_path=None):
     """
         :params:
             :param image: string with the filename of an image
+            :param roi: window clustered, None clusters the whole scene
+            :param seed: integer seed of the k-means
+            :param centroids_path: .npz file to save the centroids in
     """
     mbands = MBAND(image)
     ibands = IBAND(image)
     lm = LM(image)
-    find_water(mbands, ibands, lm)
+    find_water(mbands, ibands, lm, roi, seed, centroids_path)
 
 
+@profiling.timed('report')
 def histogram_matching(sensor, img_a, img_b):
     """
         :params:
@@ -286,11 +513,13 @@ def histogram_matching(sensor, img_a, img_b):
         sys.exit(1)
 
     matched = hist_match(source.image(), template.image())
-    plt.imshow(matched)
+    render.imshow(plt, matched)
     plt.title(title)
-    plt.show()
+    render.show(
+        "hist_{0}_{1}_{2}".format(sensor, source.title, template.title))
 
 
+@profiling.timed('report')
 def single_histogram_matched(src, template, sensor, plot_only=False,
                              multi_plots=False, side_plot=False):
     """
@@ -323,6 +552,7 @@ def single_histogram_matched(src, template, sensor, plot_only=False,
         single_histmatch_analysis(img, img2)
 
 
+@profiling.timed('report')
 def instrument_image_of_the_day(instrument, sensor):
 
     if instrument == 'vir':
@@ -331,11 +561,12 @@ def instrument_image_of_the_day(instrument, sensor):
         title = "MODIS - Image of the day"
 
     matched = day_image(instrument, sensor)
-    plt.imshow(matched)
+    render.imshow(plt, matched)
     plt.title(title)
-    plt.show()
+    render.show("image_of_the_day_{0}_{1}".format(instrument, sensor))
 
 
+@profiling.timed('report')
 def sic_or_lm_distribution(image, sensor):
     """
         :param sensor: string with the sensor to be used, options:
@@ -351,6 +582,7 @@ def sic_or_lm_distribution(image, sensor):
     distribution(img)
 
 
+@profiling.timed('report')
 def sic_or_lm_silhoutte(image, sensor):
     """
         :param sensor: string with the sensor to be used, options:
@@ -366,12 +598,14 @@ def sic_or_lm_silhoutte(image, sensor):
     silhoutte(img)
 
 
+@profiling.timed('report')
 def sic_surface_analysis(image):
     print "Preparing Surface anylysis for {0}".format(image)
     img = SIC(image)
     surface_analysis(img)
 
 
+@profiling.timed('report')
 def img_show(image, sensor):
 
     if not sensor:
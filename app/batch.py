@@ -0,0 +1,328 @@
+# ============================================================================
+#
+#
+#                             Batch Jobs
+#
+#
+# ============================================================================
+#
+#   Runs many reports in one process (python app.py --batch jobs.json). The
+#   jobs file is a list of entries like:
+#
+#       [
+#           {"report": "overlap",
+#            "granules": ["G_2015_336_0041_RS_N_VIR.mat"]},
+#           {"report": "show", "granules": "vir", "sensor": "mw_sic"},
+#           {"report": "metrics", "granules": "both",
+#            "options": {"metrics": ["sic", "nan"]}},
+#           {"report": "color", "granules": ["G_2015_336_0041_RS_N_VIR.mat"],
+#            "options": {"scene": true, "seed": 7}}
+#       ]
+#
+#   "granules" is a list of file names or an instrument (vir, mod or both)
+#   meaning all of its granules in the catalog. Jobs are regrouped by
+#   granule so the sensors every job of a granule needs are decoded once,
+#   granules are spread across --workers processes and figures are always
+#   saved into files. A manifest with the status and timing of every job is
+#   written next to the figures.
+
+import os
+import sys
+import json
+import time
+from timeit import default_timer
+from collections import OrderedDict
+
+from matplotlib import pyplot as plt
+
+from tools import catalog, data, pool, render
+from app.models import MODELS, FcImage, IbandImage, LMImage, MbandImage, \
+    SICImage
+from app.reports import pipeline
+from app.reports.analysis import hist_match
+from app.reports.color_report import CROP, blue_channels, color_clusters, \
+    find_water, rgb
+from app.reports.sic_report import distribution, land_sic_overlap, \
+    silhoutte, surface_analysis
+
+MANIFEST = 'manifest.json'
+
+# report name -> (function(filename, sensor, options), sensors). sensors is a
+# list, None for the sensor of the job, or a function of the job options.
+REPORTS = OrderedDict()
+
+
+def report(name, sensors=None):
+    """
+        Register a batch report.
+    """
+    def register(func):
+        REPORTS[name] = (func, sensors)
+        return func
+    return register
+
+
+def model(filename, sensor):
+    if sensor not in MODELS:
+        raise ValueError("Unknown sensor {0}".format(sensor))
+    return MODELS[sensor](filename)
+
+
+def cluster_options(options):
+    return {
+        'roi': None if options.get('scene') else CROP,
+        'seed': options.get('seed'),
+    }
+
+
+# ====================================================================
+#                            Reports
+# ====================================================================
+
+
+@report('show')
+def show(filename, sensor, options):
+    model(filename, sensor).show()
+
+
+@report('overlap', sensors=['lm', 'mw_sic'])
+def overlap(filename, sensor, options):
+    land_sic_overlap(LMImage(filename), SICImage(filename))
+
+
+@report('surface', sensors=['mw_sic'])
+def surface(filename, sensor, options):
+    surface_analysis(SICImage(filename))
+
+
+@report('silhoutte')
+def silhoutte_report(filename, sensor, options):
+    silhoutte(model(filename, sensor))
+
+
+@report('distribution')
+def distribution_report(filename, sensor, options):
+    distribution(model(filename, sensor))
+
+
+@report('rgb')
+def rgb_report(filename, sensor, options):
+    rgb(model(filename, sensor))
+
+
+@report('color', sensors=['ibands', 'mbands', 'fc', 'lm'])
+def color(filename, sensor, options):
+    ibands = IbandImage(filename)
+    mbands = MbandImage(filename)
+    fc = FcImage(filename)
+
+    color_clusters(ibands, mbands, fc, LMImage(filename),
+                   **cluster_options(options))
+    blue_channels(ibands, mbands, fc)
+    for image in [fc, ibands, mbands]:
+        rgb(image)
+
+
+@report('water', sensors=['mbands', 'ibands', 'lm'])
+def water(filename, sensor, options):
+    find_water(MbandImage(filename), IbandImage(filename), LMImage(filename),
+               **cluster_options(options))
+
+
+@report('histmatch')
+def histmatch(filename, sensor, options):
+    """
+        Match the granule to options['template'], another granule.
+    """
+    source = model(filename, sensor)
+    template = model(options['template'], sensor)
+
+    render.imshow(plt, hist_match(source.image(), template.image()))
+    plt.title("Histogram Matching for:\n{0} and {1}".format(
+        filename, options['template']))
+    render.show(
+        "hist_{0}_{1}_{2}".format(sensor, source.title, template.title))
+
+
+def metrics_sensors(options):
+    return pipeline.metric_sensors(options.get('metrics'))
+
+
+@report('metrics', sensors=metrics_sensors)
+def metrics(filename, sensor, options):
+    """
+        Pipeline metrics of the granule, they are saved in the manifest.
+    """
+    row = pipeline.compute(pipeline.Granule(filename), options.get('metrics'))
+    return dict((key, value.tolist() if hasattr(value, 'tolist') else value)
+                for key, value in row.iteritems())
+
+
+# ====================================================================
+#                             Runner
+# ====================================================================
+
+
+def load_jobs(path):
+    """
+        Read and check a jobs file.
+
+        :rType: list of jobs, each with an 'id'
+    """
+
+    with open(path) as f:
+        jobs = json.load(f)
+
+    for index, job in enumerate(jobs):
+        job.setdefault('id', index)
+        job.setdefault('options', {})
+        if job.get('report') not in REPORTS:
+            print "Job {0}: unknown report {1}, options are: {2}".format(
+                job['id'], job.get('report'), ", ".join(REPORTS))
+            sys.exit(1)
+        if REPORTS[job['report']][1] is None and not job.get('sensor'):
+            print "Job {0}: report {1} needs a sensor".format(
+                job['id'], job['report'])
+            sys.exit(1)
+        granules = job.get('granules')
+        if isinstance(granules, basestring) and \
+                granules.lower() not in data.INSTRUMENT_MAP:
+            print "Job {0}: unknown instrument {1}, options are: {2}".format(
+                job['id'], granules, ", ".join(sorted(data.INSTRUMENT_MAP)))
+            sys.exit(1)
+    return jobs
+
+
+def job_sensors(job):
+    sensors = REPORTS[job['report']][1]
+    if sensors is None:
+        return [job['sensor']]
+    if callable(sensors):
+        return sensors(job['options'])
+    return sensors
+
+
+def granule_tasks(jobs):
+    """
+        Regroup the jobs by granule.
+
+        :rType: OrderedDict granule -> list of jobs
+    """
+    tasks = OrderedDict()
+    for job in jobs:
+        granules = job.get('granules') or []
+        if isinstance(granules, basestring):
+            granules = catalog.files(granules.lower())
+        for filename in granules:
+            tasks.setdefault(str(filename), []).append(job)
+    return tasks
+
+
+def run_granule(item):
+    """
+        Decode the sensors every job of a granule needs once and run the
+        jobs on it. Failures are recorded, they don't stop the other jobs.
+
+        :params:
+            :param item: tuple (granule, jobs)
+
+        :rType: list of the manifest entries of the jobs
+    """
+
+    filename, jobs = item
+    filepath = os.path.join(data.DATA_DIR, filename)
+
+    sensors = set()
+    for job in jobs:
+        sensors.update(job_sensors(job))
+    sensors = sorted(sensors)
+
+    start = default_timer()
+    try:
+        data.sensors(filepath, sensors)
+        load_error = None
+    except (Exception, SystemExit), ex:
+        load_error = "{0}: {1}".format(type(ex).__name__, ex)
+    load_seconds = default_timer() - start
+
+    entries = []
+    try:
+        for job in jobs:
+            entry = OrderedDict([
+                ('id', job['id']),
+                ('report', job['report']),
+                ('granule', filename),
+                ('sensor', job.get('sensor')),
+                ('load_seconds', load_seconds),
+            ])
+
+            start = default_timer()
+            result, error = None, load_error
+            if error is None:
+                try:
+                    result = REPORTS[job['report']][0](
+                        filename, job.get('sensor'), job['options'])
+                except (Exception, SystemExit), ex:
+                    error = "{0}: {1}".format(type(ex).__name__, ex)
+
+            entry['seconds'] = default_timer() - start
+            entry['status'] = 'error' if error else 'ok'
+            entry['error'] = error
+            if result is not None:
+                entry['result'] = result
+            entries.append(entry)
+    finally:
+        for sensor in sensors:
+            data.release(filepath, sensor)
+
+    return entries
+
+
+def run(jobs, output, workers=1, fmt='png'):
+    """
+        Run the jobs saving their figures in output, and write the manifest
+        there.
+
+        :params:
+            :param jobs: list of jobs, see load_jobs
+            :param output: string with the output directory
+            :param workers: integer with the number of processes
+            :param fmt: string with the file format of the figures
+
+        :rType: dict() with the manifest
+    """
+
+    render.configure(output, fmt)
+
+    tasks = granule_tasks(jobs)
+    print "Running {0} jobs on {1} granules with {2} workers".format(
+        len(jobs), len(tasks), workers)
+
+    started = time.time()
+    entries = []
+    for results in pool.imap_granules(run_granule, tasks.items(), workers):
+        for entry in results:
+            print "{0} {1} {2} {3:.2f}s".format(
+                entry['granule'], entry['report'], entry['status'],
+                entry['seconds'])
+        entries.extend(results)
+
+    failed = len([e for e in entries if e['status'] != 'ok'])
+    manifest = OrderedDict([
+        ('started', time.strftime("%Y-%m-%dT%H:%M:%S",
+                                  time.localtime(started))),
+        ('seconds', time.time() - started),
+        ('workers', workers),
+        ('granules', len(tasks)),
+        ('runs', len(entries)),
+        ('failed', failed),
+        ('jobs', entries),
+    ])
+
+    path = os.path.join(output, MANIFEST)
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print "{0} of {1} runs failed, manifest saved in {2}".format(
+        failed, len(entries), path)
+
+    return manifest
@@ -1,3 +1,8 @@
 from image_nd import FcImage, MbandImage, IbandImage
 from image_2d import SICImage, SSTImage, LMImage, SSTImage, NPRImage, \
     NGRImage, TEMPImage
+
+# sensor name -> image model
+MODELS = dict((model.SENSOR, model) for model in (
+    SICImage, SSTImage, LMImage, NPRImage, NGRImage, TEMPImage, FcImage,
+    MbandImage, IbandImage))
@@ -2,11 +2,10 @@ import os
 import sys
 
 import numpy as np
-from scipy.stats import itemfreq
 from matplotlib import pyplot as plt
-from scipy.ndimage import filters, sobel
 
-from tools import data
+from tools import compact, data, profiling, render, static, stats, tiles
+from tools.bitmask import BitMask
 
 
 class Image2D(object):
@@ -18,13 +17,37 @@ class Image2D(object):
         self.filepath = os.path.join(data.DATA_DIR, self.filename)
         self.title = filename[2:15]
 
-    def image(self):
+    @profiling.model
+    def image(self, roi=None):
         """
-            Returns the raw ndarray image
+            Returns the raw ndarray image as float64, NaN where there's no
+            data. It's a new array when the sensor is kept compact.
+
+            :params:
+                :param roi: tuple (rows, cols) with the window to read, see
+                            tools.data.roi_index. None reads the whole image.
+
+            :rtype: ndarray
+        """
+        return compact.widen(self.compact(roi))
+
+    def compact(self, roi=None):
+        """
+            Returns the image in the type it's kept in memory, see
+            tools.compact: bool for lm, uint8 (or float32) for mw_sic.
+
+            :params:
+                :param roi: see image()
 
             :rtype: ndarray
         """
-        return data.mat_file(self.filepath).get(self.SENSOR)
+        return data.window(data.sensor(self.filepath, self.SENSOR), roi)
+
+    def release(self):
+        """
+            Drop this image's decoded array from the shared granule cache.
+        """
+        data.release(self.filepath, self.SENSOR)
 
     def date(self):
         return data.parse_date(self.filename)
@@ -38,16 +61,17 @@ class Image2D(object):
             print "Image is not VIRS or MODIS, check your file"
             sys.exit(1)
 
+    @profiling.model
     def nan_percentage(self):
-        nan_count = np.count_nonzero(~np.isnan(self.image()))
-        return (nan_count / self.image().size) * 100
+        nan = compact.missing(self.compact())
+        return stats.percentage(np.count_nonzero(nan), nan.size)
 
     def show(self, colorbar=True):
-        plt.imshow(self.image())
+        render.imshow(plt, self.image())
         plt.title(self.filename)
         if colorbar:
             plt.colorbar()
-        plt.show()
+        render.show("{0}_{1}".format(self.SENSOR, self.title))
 
 
 class LMImage(Image2D):
@@ -56,12 +80,17 @@ class LMImage(Image2D):
     """
     SENSOR = 'lm'
 
+    def __init__(self, filename):
+        super(LMImage, self).__init__(filename)
+        self._digest = None
+
     # =================================================
     #
     #                Analysis Functions
     #
     # =================================================
 
+    @profiling.model
     def percentage(self):
         """
             rType: dict()
@@ -72,36 +101,101 @@ class LMImage(Image2D):
             'other': 0,
         }
 
-        freqs = itemfreq(self.image())
+        counts = stats.mask_counts(land=self.land_mask())
 
-        percentages['lm'] = (float(freqs[1][1]) / self.image().size) * 100
-        percentages['other'] = (float(freqs[0][1]) / self.image().size) * 100
+        percentages['lm'] = stats.percentage(counts['land'], counts['total'])
+        percentages['other'] = stats.percentage(counts['other'],
+                                                counts['total'])
 
         return percentages
 
+    def digest(self):
+        """
+            Content hash of the land mask. The mask is the same grid in every
+            granule, products derived from it are memoized by this hash (see
+            tools/static.py).
+
+            :rtype: string
+        """
+        if self._digest is None:
+            self._digest = static.digest(self.compact())
+        return self._digest
+
+    @profiling.model
     def silhoutte(self):
         """
-            Returns the border of the land mask.
+            Returns the border of the land mask. Computed once per distinct
+            land mask, the returned array is read only.
 
             :rtype: ndarray
         """
-        silhoutte = filters.generic_laplace(self.image(), sobel)
-        condlist = [silhoutte < 0, silhoutte > 0]
-        choicelist = [1, 1]
-        return np.select(condlist, choicelist)
+        def compute():
+            silhoutte = tiles.laplace_sobel(self.compact())
+            condlist = [silhoutte < 0, silhoutte > 0]
+            choicelist = [1, 1]
+            return np.select(condlist, choicelist)
+
+        return static.derived(self.digest(), 'silhoutte', compute)
+
+    @profiling.model
+    def border_pixels(self):
+        """
+            Number of pixels in the border of the land mask.
+
+            :rtype: int
+        """
+        return static.derived(
+            self.digest(), 'border_pixels', lambda: self.border_mask().count())
+
+    @profiling.model
+    def land_pixels(self):
+        """
+            Number of land pixels in the land mask.
+
+            :rtype: int
+        """
+        return static.derived(
+            self.digest(), 'land_pixels', lambda: self.land_mask().count())
+
+    @profiling.model
+    def land_mask(self):
+        """
+            Land pixels packed 8 per byte, see tools.bitmask
+
+            :rtype: BitMask
+        """
+        return BitMask.pack(self.compact() == 1)
+
+    @profiling.model
+    def border_mask(self):
+        """
+            silhoutte() packed 8 pixels per byte, computed once per distinct
+            land mask like silhoutte().
+
+            :rtype: BitMask
+        """
+        shape = self.compact().shape
+        bits = static.derived(self.digest(), 'border_bits',
+                              lambda: BitMask.pack(self.silhoutte()).bits)
+        return BitMask(bits, shape)
 
 
 class SICImage(Image2D):
 
     SENSOR = 'mw_sic'
 
+    # Ice concentration levels of the extent curves
+    EXTENT_LEVELS = (15, 30, 40, 50, 70, 85)
+
     # =================================================
     #
     #                 Analysis Functions
     #
     # =================================================
 
-    def surface(self, ice_concentration_level=40, boolean=True):
+    @profiling.model
+    def surface(self, ice_concentration_level=40, boolean=True,
+                packed=False):
         """
             Returns a boolean array that contains the area where there is ice.
 
@@ -114,16 +208,21 @@ class SICImage(Image2D):
                                                 of analysis.
                 :param boolean: flag to tell this function to return a boolean
                                 array. By default is True.
-            :rType: ndarray
+                :param packed: return a BitMask (see tools.bitmask) instead
+                               of an array.
+            :rType: ndarray, or BitMask when packed
         """
 
         # Converto boolean ndarray, ice is marked as True and for it to be true
         # we are assuming that sea ice above 40
-        sea_ice = [self.image() > ice_concentration_level][0]
+        sea_ice = compact.above(self.compact(), ice_concentration_level)
+        if packed:
+            return BitMask.pack(sea_ice)
         if not boolean:
             return sea_ice.astype(int)
         return sea_ice
 
+    @profiling.model
     def percentage(self):
         """
             rType: dict()
@@ -134,14 +233,55 @@ class SICImage(Image2D):
             "other": 0,
         }
 
-        sea_ice = self.surface()
-        freqs = itemfreq(sea_ice)
+        counts = self.counts()
 
-        percentages['ice'] = (float(freqs[1][1]) / self.image().size) * 100
-        percentages['other'] = (float(freqs[0][1]) / self.image().size) * 100
+        percentages['ice'] = stats.percentage(counts['ice'], counts['total'])
+        percentages['other'] = stats.percentage(counts['other'],
+                                                counts['total'])
 
         return percentages
 
+    @profiling.model
+    def counts(self, land=None, ice_concentration_level=40):
+        """
+            Pixel counts of the sea ice surface, see tools.stats.mask_counts
+
+            :params:
+                :param land: BitMask or boolean ndarray with the land (or its
+                             border) to overlap with the sea ice, optional.
+                :param ice_concentration_level: integer, see surface()
+            :rType: dict()
+        """
+        if land is not None and not isinstance(land, BitMask):
+            land = BitMask.pack(land)
+
+        return stats.mask_counts(
+            ice=self.surface(ice_concentration_level, packed=True), land=land,
+            nan=BitMask.pack(compact.missing(self.compact())))
+
+    @profiling.model
+    def histogram(self):
+        """
+            Sea ice concentration histogram, see
+            tools.stats.concentration_histogram
+
+            :rType: ndarray
+        """
+        return stats.concentration_histogram(self.compact())
+
+    @profiling.model
+    def extent(self, levels=EXTENT_LEVELS):
+        """
+            Percentage of the image with ice above each level, the same as
+            percentage()['ice'] with surface(level) but every level comes from
+            one histogram of the image.
+
+            :params:
+                :param levels: integer ice concentration levels
+            :rType: dict() level -> percentage
+        """
+        return stats.exceedance(self.histogram(), self.compact().size, levels)
+
 
 class SSTImage(Image2D):
     """
@@ -4,12 +4,14 @@ import sys
 import numpy as np
 from matplotlib import pyplot as plt
 
-from tools import data
+from tools import data, profiling, render, stats
 
 
 class ImageND(object):
 
     SENSOR = None
+    # channel name -> band position in the raw (bands, rows, cols) array
+    CHANNELS = {}
 
     def __init__(self, filename, dimensions=3):
 
@@ -30,129 +32,120 @@ class ImageND(object):
             return True
         return False
 
-    def image(self):
+    @profiling.model
+    def raw(self):
         """
-            Returns the raw ndarray image
+            Returns the decoded sensor as stored in the granule, with the bands
+            on the first axis (bands, rows, cols). Bands are kept as float32,
+            see tools.compact.
 
             :rtype: ndarray
         """
-        image = data.mat_file(self.filepath).get(self.SENSOR)
+        image = data.sensor(self.filepath, self.SENSOR)
         if not self.__validate(image):
             print "Invalid dimensions or sensor {0} isn't in the image".format(
-                self.sensor)
+                self.SENSOR)
             sys.exit(1)
-        return np.dstack(image)
+        return image
+
+    @profiling.model
+    def image(self, roi=None):
+        """
+            Returns the raw ndarray image
+
+            :params:
+                :param roi: tuple (rows, cols) with the window to read, see
+                            tools.data.roi_index. None reads the whole image.
+
+            :rtype: ndarray
+        """
+        return np.dstack(self.raw()[data.roi_index(roi)])
+
+    @profiling.model
+    def band(self, index, roi=None):
+        """
+            Returns a single band of the image without stacking the others.
+
+            :params:
+                :param index: integer with the band position
+                :param roi: tuple (rows, cols) with the window to read, see
+                            tools.data.roi_index. None reads the whole band.
 
+            :rtype: ndarray
+        """
+        return data.window(self.raw()[index], roi)
+
+    def release(self):
+        """
+            Drop this image's decoded array from the shared granule cache.
+        """
+        data.release(self.filepath, self.SENSOR)
+
+    @profiling.model
     def nan_percentage(self):
-        nan_count = np.count_nonzero(~np.isnan(self.image()))
-        return (nan_count / self.image().size) * 100
+        nan = np.isnan(self.raw())
+        return stats.percentage(np.count_nonzero(nan), nan.size)
 
     def date(self):
         return data.parse_date(self.filename)
 
     def show(self, colorbar=True):
-        plt.imshow(self.image())
+        render.imshow(plt, self.image())
         plt.title(self.filename)
         if colorbar:
             plt.colorbar()
-        plt.show()
+        render.show("{0}_{1}".format(self.SENSOR, self.title))
 
     # =====================================
     #                Analysis
     # =====================================
 
-    def rgb(self):
+    @profiling.model
+    def rgb(self, roi=None):
         """
             Return 3-tuple with (r, g, b)
         """
 
-        red = self.channel("red")
-        green = self.channel("green")
-        blue = self.channel("blue")
+        red = self.channel("red", roi)
+        green = self.channel("green", roi)
+        blue = self.channel("blue", roi)
 
         return (red, green, blue)
 
-    def channel(self, channel=None):
-        """
-            This function is to be overwritten in by subclass
-        """
-        return None
-
-
-class IbandImage(ImageND):
-
-    SENSOR = "ibands"
-
-    def channel(self, channel=None):
+    @profiling.model
+    def channel(self, channel=None, roi=None):
         """
             Returns a specific channel, the options are:
                 - red, green, blue
 
             :params:
                 :params channel: string with the specified channel
+                :params roi: tuple (rows, cols) with the window to read, see
+                             tools.data.roi_index.
 
             :rType: ndarray
         """
+        index = self.CHANNELS.get((channel or '').strip().lower())
 
-        if channel == 'red':
-            return self.image()[:, :, 0]
-        elif channel == 'green':
-            return self.image()[:, :, 1]
-        elif channel == 'blue':
-            return self.image()[:, :, 2]
-        else:
+        if index is None:
             print "Channel requested wasn't red, green or blue"
+            return None
+        return self.band(index, roi)
 
 
-class MbandImage(ImageND):
+class IbandImage(ImageND):
 
-    SENSOR = "mbands"
+    SENSOR = "ibands"
+    CHANNELS = {'red': 0, 'green': 1, 'blue': 2}
 
-    def channel(self, channel=None):
-        """
-            Returns a specific channel, the options are:
-                - red
-                - blue
 
-            :params:
-                :params channel: string with the specified channel
+class MbandImage(ImageND):
 
-            :rType: ndarray
-        """
-        channel = channel.strip().lower()
-
-        if channel == 'red':
-            return self.image()[:, :, 2]
-        elif channel == 'green':
-            return self.image()[:, :, 1]
-        elif channel == 'blue':
-            return self.image()[:, :, 0]
-        else:
-            print "Channel requested wasn't red, green or blue"
+    SENSOR = "mbands"
+    CHANNELS = {'red': 2, 'green': 1, 'blue': 0}
 
 
 class FcImage(ImageND):
 
     SENSOR = "fc"
-
-    def channel(self, channel=None):
-        """
-            Returns a specific channel, the options are:
-                - red
-                - blue
-
-            :params:
-                :params channel: string with the specified channel
-
-            :rType: ndarray
-        """
-        channel = channel.strip().lower()
-
-        if channel == 'red':
-            return self.image()[:, :, 0]
-        elif channel == 'green':
-            return self.image()[:, :, 1]
-        elif channel == 'blue':
-            return self.image()[:, :, 2]
-        else:
-            print "Channel requested wasn't red, green or blue"
+    CHANNELS = {'red': 0, 'green': 1, 'blue': 2}
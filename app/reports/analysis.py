@@ -2,10 +2,17 @@ import sys
 
 import numpy as np
 
-from tools import data
+from tools import catalog, render
 from matplotlib import pyplot as plt
 from app.models import SICImage as SIC, LMImage as LM
 
+# Largest range of integer pixel values matched with counting and a lookup
+# table, wider ranges fall back to sorting with np.unique.
+MAX_LUT_SPAN = 1 << 16
+
+# Points of a plotted ECDF, see ECDF.resample
+CDF_POINTS = 2000
+
 
 def day_image(instrument, lense):
     """
@@ -26,7 +33,7 @@ def day_image(instrument, lense):
         print "Provide an instrument id, see tools/data.py for details."
         sys.exit(1)
 
-    files = data.file_names(data.INSTRUMENT_MAP.get(instrument))
+    files = catalog.files(instrument)
 
     if len(files) == 0:
         print "There are no files to be analyzed. Check file path"
@@ -76,15 +83,11 @@ def single_histmatch_analysis(source, template, side_by_side=False):
             :param side_by_side: bool flag to show side by side the 2 plots
     """
 
-    matched = hist_match(source.image(), template.image())
-
-    # Empirical CDF axes of source, template and histogram
-    x1, y1 = ecdf(source.image().ravel())
-    x2, y2 = ecdf(template.image().ravel())
-    x3, y3 = ecdf(matched.ravel())
+    source_image, template_image, matched, cdfs = match_cdfs(source, template)
+    summary = ks_summary(*cdfs)
 
     if side_by_side:
-        fig = plt.figure()
+        fig = render.figure()
         fig.suptitle(
             "1. {0}. 2. {1}. 3. Histogram Match".format(
                 source.filename, template.filename),
@@ -92,31 +95,35 @@ def single_histmatch_analysis(source, template, side_by_side=False):
         )
 
         fig.add_subplot(1, 3, 1)
-        plt.imshow(source.image())
+        render.imshow(plt, source_image)
 
         fig.add_subplot(1, 3, 2)
-        plt.imshow(template.image())
+        render.imshow(plt, template_image)
 
         fig.add_subplot(1, 3, 3)
-        plt.imshow(matched)
+        render.imshow(plt, matched)
+        fig.text(0.5, 0.02, summary, ha='center')
     else:
-        fig, axes = plt.subplots(2, 2)
+        fig, axes = render.subplots(2, 2)
         fig.subplots_adjust(hspace=0.6, wspace=0.22)
 
-        axes[0][0].imshow(source.image())
+        render.imshow(axes[0][0], source_image)
         axes[0][0].set_title("Source: {0}".format(source.title))
 
-        axes[0][1].imshow(template.image())
+        render.imshow(axes[0][1], template_image)
         axes[0][1].set_title("Template: {0}".format(template.title))
 
-        axes[1][0].imshow(matched)
+        render.imshow(axes[1][0], matched)
         axes[1][0].set_title("Hist. Mactch of Source and Template")
 
         # Red dashes for MODIS. Blue dots for VIRS
+        x1, y1 = cdfs[0].resample()
+        x2, y2 = cdfs[1].resample()
         axes[1][1].plot(x1, y1, 'r--', x2, y2, 'b:')
         axes[1][1].set_title("Hist. Mactch of Source and Template")
+        axes[1][1].set_xlabel(summary, fontsize=8)
 
-    plt.show()
+    render.show("histmatch_{0}_{1}".format(source.title, template.title))
 
 
 def histmatch_plot(source, template, multi_plots=False):
@@ -130,15 +137,14 @@ def histmatch_plot(source, template, multi_plots=False):
                            and template.
     """
 
-    matched = hist_match(source.image(), template.image())
+    cdfs = match_cdfs(source, template)[3]
+    summary = ks_summary(*cdfs)
 
-    # Empirical CDF axes of source, template and histogram
-    x1, y1 = ecdf(source.image().ravel())
-    x2, y2 = ecdf(template.image().ravel())
-    x3, y3 = ecdf(matched.ravel())
+    # Empirical CDF axes of source, template and histogram, CDF_POINTS each
+    (x1, y1), (x2, y2), (x3, y3) = [cdf.resample() for cdf in cdfs]
 
     if multi_plots:
-        fig, (ax1, ax2, ax3) = plt.subplots(3, sharex=True, sharey=False)
+        fig, (ax1, ax2, ax3) = render.subplots(3, sharex=True, sharey=False)
         fig.suptitle("1. MODIS. 2. VIRS. 3. Histogram Match", fontsize=14)
 
         ax1.plot(x1, y1)
@@ -149,6 +155,7 @@ def histmatch_plot(source, template, multi_plots=False):
 
         ax3.plot(x3, y3)
         ax3.set_title('Histogram Match')
+        ax3.set_xlabel(summary)
 
         # Fine-tune figure; make subplots close to each other and hide x ticks
         # for all but bottom plot.
@@ -157,54 +164,255 @@ def histmatch_plot(source, template, multi_plots=False):
     else:
         plt.plot(x1, y1, 'r--', x2, y2, 'b:')
         plt.title("Histogram for {0} and {1}".format(source.title, template.title))
+        plt.xlabel(summary)
+
+    render.show("histmatch_cdf_{0}_{1}".format(source.title, template.title))
+
+
+def match_cdfs(source, template):
+    """
+        Match source to template reading each image once.
+
+        :params:
+            :param source: Image2D or ImageND representing the source image.
+            :param template: Image2D or ImageND representing the template
+                             image.
+
+        :rtype: tuple (source image, template image, matched image, list with
+                the ECDF of the source, template and matched images)
+    """
+    source_image = source.image()
+    template_image = template.image()
+
+    template_cdf = ECDF(template_image)
+    matched = hist_match(source_image, template_cdf)
+
+    cdfs = [ECDF(source_image), template_cdf, ECDF(matched)]
+    return source_image, template_image, matched, cdfs
 
-    plt.show()
 
-def hist_match(source, template):
+def ks_summary(source_cdf, template_cdf, matched_cdf):
+    """
+        Kolmogorov-Smirnov distances (the largest CDF difference) of the
+        source and the matched image to the template, as a label.
+
+        :rtype: string
+    """
+    before, _ = source_cdf.ks_distance(template_cdf)
+    after, _ = matched_cdf.ks_distance(template_cdf)
+    return "KS to template: source {0:.4f}, matched {1:.4f}".format(
+        before, after)
+
+def hist_match(source, template, full_output=False):
     """
         Adjust the pixel values of a grayscale image such that its histogram
-        matches that of a target image
+        matches that of a target image. Only finite pixels take part in the
+        matching, NaN pixels of the source are NaN in the output.
 
         :params:
             :param source: np.ndarray Image to transform; the histogram is
                            computed over the flattened
             :param template: np.ndarray Template image; can have different
-                             dimensions to source
+                             dimensions to source. It can also be an ECDF of
+                             the template, built once and reused to match
+                             many sources.
+            :param full_output: also return the number of valid (finite)
+                                source pixels that were matched.
         :return: match output array, the transformed output image
-        :rtype: np.ndarray
+        :rtype: np.ndarray, or tuple (np.ndarray, int) with full_output
     """
 
     oldshape = source.shape
 
     source = source.ravel()
-    template = template.ravel()
+    if not isinstance(template, ECDF):
+        template = ECDF(template)
+
+    valid = np.isfinite(source) if source.dtype.kind == 'f' else None
+    if valid is not None and valid.all():
+        valid = None
+
+    if valid is None:
+        count = source.size
+        matched = _match(source, template)
+    else:
+        count = np.count_nonzero(valid)
+        matched = np.empty(source.shape, dtype=np.float64)
+        matched.fill(np.nan)
+        matched[valid] = _match(source[valid], template)
+
+    matched = matched.reshape(oldshape)
+    if full_output:
+        return matched, count
+    return matched
+
+
+def _match(source, template):
+    """
+        hist_match on a flat array of finite values
+    """
+
+    if source.size == 0 or template.count == 0:
+        matched = np.empty(source.shape, dtype=np.float64)
+        matched.fill(np.nan)
+        return matched
+
+    domain = _integer_domain(source)
+    if domain is not None:
+        # Small set of integer values (mw_sic, lm): count them instead of
+        # sorting and map every pixel through a lookup table.
+        low, span = domain
+        bin_idx = (source - low).astype(np.intp)
+        counts = np.bincount(bin_idx, minlength=span)
+        present = np.flatnonzero(counts)
+
+        s_quantiles = np.cumsum(counts[present]).astype(np.float64)
+        s_quantiles /= s_quantiles[-1]
+
+        lut = np.zeros(span, dtype=np.float64)
+        lut[present] = np.interp(
+            s_quantiles, template.quantiles, template.values)
+
+        return lut[bin_idx]
 
     # get the set of unique pixel values and their corresponding indices and
     # counts
     s_values, bin_idx, s_counts = np.unique(
         source, return_inverse=True, return_counts=True)
-    t_values, t_counts = np.unique(template, return_counts=True)
 
     # take the cumsum of the counts and normalize by the number of pixels to
     # get the empirical cumulative distribution functions for the source and
     # template images (maps pixel value --> quantile)
     s_quantiles = np.cumsum(s_counts).astype(np.float64)
     s_quantiles /= s_quantiles[-1]
-    t_quantiles = np.cumsum(t_counts).astype(np.float64)
-    t_quantiles /= t_quantiles[-1]
 
     # interpolate linearly to find the pixel values in the template image
     # that correspond most closely to the quantiles in the source image
-    interp_t_values = np.interp(s_quantiles, t_quantiles, t_values)
+    interp_t_values = np.interp(s_quantiles, template.quantiles,
+                                template.values)
+
+    return interp_t_values[bin_idx]
+
+
+class ECDF(object):
+    """
+        Empirical CDF of the finite pixels of an image: its distinct values
+        and the quantile of each one (maps pixel value --> quantile). NaNs are
+        left out, count holds the number of valid pixels. Build it once for a
+        template and pass it to hist_match to match as many sources as needed
+        without computing the template's quantiles again.
+    """
+
+    def __init__(self, image):
+        x = finite(np.asarray(image).ravel())
+        self.count = x.size
+        self.values, counts = unique_counts(x)
+        self.quantiles = np.cumsum(counts).astype(np.float64)
+        if self.count:
+            self.quantiles /= self.quantiles[-1]
+
+    def __call__(self, x):
+        """
+            Fraction of the pixels lower or equal than x.
+
+            :rtype: np.ndarray
+        """
+        index = np.searchsorted(self.values, x, side='right')
+        return np.concatenate(([0.0], self.quantiles))[index]
+
+    def resample(self, points=CDF_POINTS):
+        """
+            Returns at most points + 1 (value, quantile) points of the ECDF to
+            plot it. A point is kept every time the quantile goes up 1/points
+            (and at both ends), so between two kept points the ECDF changes
+            by less than 1/points. Values with more pixels than that are
+            always kept.
+
+            :rtype: tuple (values, quantiles)
+        """
+        if self.values.size <= points + 1:
+            return self.values, self.quantiles
+
+        levels = np.arange(1, points) / float(points)
+        index = np.searchsorted(self.quantiles, levels, side='left')
+        index = np.unique(np.concatenate(
+            ([0], index, [self.values.size - 1])))
+        return self.values[index], self.quantiles[index]
+
+    def ks_distance(self, other):
+        """
+            Kolmogorov-Smirnov statistic of this ECDF and other, the largest
+            difference between them, and the value where it happens.
+
+            :rtype: tuple (distance, value), (nan, None) if one is empty
+        """
+        if not self.count or not other.count:
+            return float('nan'), None
+
+        values = np.union1d(self.values, other.values)
+        difference = np.abs(self(values) - other(values))
+        index = difference.argmax()
+        return float(difference[index]), values[index].item()
+
+
+def finite(x):
+    """
+        Returns the finite values of x, x itself when there is nothing to
+        drop.
+
+        :rtype: np.ndarray
+    """
+    if x.dtype.kind != 'f':
+        return x
+    valid = np.isfinite(x)
+    if valid.all():
+        return x
+    return x[valid]
+
+
+def unique_counts(x):
+    """
+        Same as np.unique(x, return_counts=True), it counts with bincount in
+        linear time when x only holds integer values in a small range.
+
+        :rtype: tuple (values, counts)
+    """
+    domain = _integer_domain(x)
+    if domain is None:
+        return np.unique(x, return_counts=True)
+
+    low, span = domain
+    counts = np.bincount((x - low).astype(np.intp), minlength=span)
+    present = np.flatnonzero(counts)
+    return (present + low).astype(x.dtype), counts[present]
+
+
+def _integer_domain(x):
+    """
+        Returns (lowest value, span) when every value of x is an integer and
+        the span fits in a lookup table of MAX_LUT_SPAN entries, None
+        otherwise.
+    """
+    if x.size == 0 or x.dtype.kind not in 'iuf':
+        return None
+
+    low, high = x.min(), x.max()
+    if not (np.isfinite(low) and np.isfinite(high)):
+        return None
+
+    span = int(high - low) + 1
+    if span > MAX_LUT_SPAN:
+        return None
+    if x.dtype.kind == 'f' and not np.array_equal(x, np.floor(x)):
+        return None
 
-    return interp_t_values[bin_idx].reshape(oldshape)
+    return low, span
 
 
 def ecdf(x):
     """
-        convenience function for computing the empirical CDF
+        convenience function for computing the empirical CDF, NaNs are left
+        out.
     """
-    vals, counts = np.unique(x, return_counts=True)
-    ecdf = np.cumsum(counts).astype(np.float64)
-    ecdf /= ecdf[-1]
-    return  vals, ecdf
+    cdf = ECDF(x)
+    return cdf.values, cdf.quantiles
@@ -0,0 +1,157 @@
+# ============================================================================
+#
+#
+#                       Full Scene Classification
+#
+#
+# ============================================================================
+#
+#   Labels every pixel of a granule with the nearest of a set of centroids
+#   found by the clustering reports (see color_report.color_clusters), tile
+#   by tile so only a band of rows of each layer is in memory at a time. The
+#   tiles are read from the memory mapped store, granules that haven't been
+#   converted with `python -m tools.ingest` are decoded whole by loadmat
+#   first, so ingest the archive before classifying it. The labels are saved
+#   in the granule store as a uint8 'labels' raster:
+#
+#       centroids, layers = classification.load_centroids('clusters.npz')
+#       classification.classify_archive(files, centroids, layers, workers=8)
+#
+#   A layer is a (sensor, channel) pair, the channel is a color name or the
+#   band position, e.g. ('ibands', 'blue') or ('mbands', 3).
+
+import os
+import functools
+
+import numpy as np
+
+from tools import data, kmeans, pool, store
+from app.models import FcImage, IbandImage, LMImage, MbandImage
+
+MODELS = {
+    IbandImage.SENSOR: IbandImage,
+    MbandImage.SENSOR: MbandImage,
+    FcImage.SENSOR: FcImage,
+}
+
+LABELS_SENSOR = 'labels'
+
+# Label of the pixels that aren't classified, land or NaN in any layer
+NO_LABEL = 255
+
+# Rows classified at a time
+TILE_ROWS = 256
+
+
+def save_centroids(path, centroids, layers):
+    """
+        Save centroids and the layers they were computed from in a .npz file.
+
+        :params:
+            :param path: string with the file path
+            :param centroids: ndarray (clusters, layers)
+            :param layers: list of (sensor, channel) pairs in the same order
+                           as the centroid columns.
+    """
+    np.savez(path, centroids=centroids,
+             layers=np.array(["{0}:{1}".format(*layer) for layer in layers]))
+    print "Centroids saved in {0}".format(path)
+
+
+def load_centroids(path):
+    """
+        Load the centroids and layers saved by save_centroids.
+
+        :rType: tuple (centroids, layers)
+    """
+    saved = np.load(path)
+    try:
+        centroids = saved['centroids']
+        names = saved['layers']
+    finally:
+        saved.close()
+
+    layers = []
+    for layer in names:
+        sensor, channel = str(layer).split(':')
+        layers.append((sensor, int(channel) if channel.isdigit() else channel))
+    return centroids, layers
+
+
+def read_layer(image, channel, roi):
+    """
+        Read one layer of an ImageND, channel is a color name or a band index.
+    """
+    if isinstance(channel, int):
+        return image.band(channel, roi)
+    return image.channel(channel, roi)
+
+
+def classify(filename, centroids, layers, tile_rows=TILE_ROWS):
+    """
+        Label every pixel of filename with the index of its nearest centroid,
+        land and pixels that are NaN in any layer get NO_LABEL. Only a tile of
+        each layer is in memory when filename is in the store (see
+        tools.ingest), otherwise the layers are loaded whole.
+
+        :params:
+            :param filename: string with the granule file name
+            :param centroids: ndarray (clusters, layers), see load_centroids
+            :param layers: list of (sensor, channel) pairs
+            :param tile_rows: integer with the rows classified at a time
+
+        :rType: ndarray uint8 (rows, cols)
+    """
+
+    images = [(MODELS[sensor](filename), channel)
+              for sensor, channel in layers]
+    lm = LMImage(filename)
+
+    rows, cols = lm.compact().shape
+    labels = np.empty((rows, cols), dtype=np.uint8)
+
+    for start in xrange(0, rows, tile_rows):
+        roi = ((start, start + tile_rows), (None, None))
+
+        tile = [read_layer(image, channel, roi) for image, channel in images]
+        data_mask = lm.compact(roi=roi) != 1
+        for layer in tile:
+            data_mask &= np.isfinite(layer)
+
+        points = np.column_stack([layer[data_mask] for layer in tile])
+
+        out = labels[start:start + tile_rows]
+        out.fill(NO_LABEL)
+        if len(points):
+            out[data_mask] = kmeans.assign(points, centroids)
+
+    return labels
+
+
+def classify_granule(filename, centroids, layers):
+    """
+        Classify filename and save the labels in its store directory.
+
+        :rType: tuple (filename, ndarray with the pixels of each label)
+    """
+
+    labels = classify(filename, centroids, layers)
+    filepath = os.path.join(data.DATA_DIR, filename)
+    store.save_sensor(filepath, LABELS_SENSOR, labels)
+
+    for sensor in set(sensor for sensor, _ in layers) | set([LMImage.SENSOR]):
+        data.release(filepath, sensor)
+
+    counts = np.bincount(labels.ravel(), minlength=len(centroids))
+    return filename, counts[:len(centroids)]
+
+
+def classify_archive(files, centroids, layers, workers=1):
+    """
+        Classify every granule in files across workers processes.
+
+        :rType: Generator of classify_granule results
+    """
+    func = functools.partial(classify_granule, centroids=centroids,
+                             layers=layers)
+    return pool.imap_granules(func, files, workers)
@@ -10,9 +10,22 @@ import sys
 
 import numpy as np
 from matplotlib import pyplot as plt
-from scipy.cluster.vq import kmeans, vq
 
+from tools import kmeans, render
 from app.models import MbandImage
+from app.reports.classification import save_centroids
+
+# Window used by the clustering reports, rows from 2500 to the end and
+# columns 2500 to 3000. See tools.data.roi_index.
+CROP = ((2500, None), (2500, 3000))
+
+# Layers clustered by color_clusters and find_water, (sensor, channel) pairs
+# as used by app.reports.classification
+COLOR_LAYERS = [('ibands', 'blue'), ('mbands', 'blue'), ('fc', 'blue')]
+WATER_LAYERS = [('mbands', 3), ('ibands', 'blue')]
+
+# Most points drawn in the cluster plots, more are sampled down
+PLOT_POINTS = 20000
 
 
 def rgb(image, original=True):
@@ -35,28 +48,28 @@ def rgb(image, original=True):
 
     pos1, pos2, pos3, pos4 = (221, 222, 223, 224)
 
-    figure = plt.figure()
+    figure = render.figure()
     figure.suptitle(
         "RGB for {0} using {1}".format(image.filename, image.SENSOR))
 
     plt.subplot(pos1)
-    plt.imshow(red)
+    render.imshow(plt, red)
     plt.title("Red Channel")
 
     plt.subplot(pos2)
-    plt.imshow(green)
+    render.imshow(plt, green)
     plt.title("Green Channel")
 
     plt.subplot(pos3)
-    plt.imshow(blue)
+    render.imshow(plt, blue)
     plt.title("Blue Channel")
 
     if original:
         plt.subplot(pos4)
-        plt.imshow(image.image())
+        render.imshow(plt, image.image())
         plt.title("Original Image")
 
-    plt.show()
+    render.show("rgb_{0}_{1}".format(image.SENSOR, image.title))
 
 
 def blue_channels(ibands_image, mbands_image, fc_image):
@@ -68,31 +81,39 @@ def blue_channels(ibands_image, mbands_image, fc_image):
     blue2 = mbands_image.channel('blue')
     blue3 = fc_image.channel('blue')
 
-    blues = plt.figure()
+    blues = render.figure()
     blues.suptitle("RBG blue layer for fc, ibands, mbands", fontsize=16)
 
     ibands_plot = plt.subplot(221)
     ibands_plot.set_title("ibands blue")
-    ibands_plot.imshow(blue1)
+    render.imshow(ibands_plot, blue1)
 
     mbands_plot = plt.subplot(222)
     mbands_plot.set_title("mbands blue")
-    mbands_plot.imshow(blue2)
+    render.imshow(mbands_plot, blue2)
 
     fc_plot = plt.subplot(223)
     fc_plot.set_title("fc blue")
-    fc_plot.imshow(blue3)
+    render.imshow(fc_plot, blue3)
 
-    plt.show()
+    render.show("blue_channels_{0}".format(ibands_image.title))
 
 
-def find_water(mbands, ibands, lm):
+def find_water(mbands, ibands, lm, roi=CROP, seed=None, centroids_path=None):
     """
         Find water ice clusters using imbands and mbands
 
+        :params:
+            :param roi: window clustered, see tools.data.roi_index. None
+                        clusters the whole scene.
+            :param seed: integer seed of the k-means, see tools.kmeans
+            :param centroids_path: string with a .npz file to save the
+                                   centroids in, to classify other granules
+                                   with them (see app.reports.classification)
     """
 
     MAX_NAN_PERCENTAGE = 10.00
+    title = mbands.title
 
     # if image.nan_percentage() > MAX_NAN_PERCENTAGE:
         # print "{0} has more than {1}% NaN values".format(
@@ -102,48 +123,53 @@ def find_water(mbands, ibands, lm):
         # print "{0} is not mbands".format(image.filename)
         # sys.exit(1)
 
-    lm = lm.image()[2500:, range(2500, 3000)]
+    lm = lm.compact(roi=roi).astype(bool)
 
     # mbands 4 layer show landmask in great detail, making it different
     # from ice and water, ice shows up red.
-    mbands = mbands.image()[:, :, 3][2500:, range(2500, 3000)]
-    valid_mask = np.isfinite(mbands)
-    data_mask = valid_mask & ~lm
-    x = mbands[data_mask.astype(bool)]
+    mbands = mbands.band(3, roi=roi)
 
     # Show the first mbands image to be used
-    plt.imshow(mbands)
-    plt.show()
+    render.imshow(plt, mbands)
+    render.show("water_mbands_{0}".format(title))
 
     # ibands show ice very red water show's up very blue, land maske it's
     # a similar blue to ice, owever this shouldn't be a problem because we
     # are removeing lm from the analysis.
-    ibands = ibands.image()[:, :, 2][2500:, range(2500, 3000)]
-    valid_mask = np.isfinite(ibands)
-    data_mask = valid_mask & ~lm
-    y = ibands[data_mask.astype(bool)]
+    ibands = ibands.channel('blue', roi=roi)
 
     # Show the first mbands image to be used
-    plt.imshow(ibands)
-    plt.show()
+    render.imshow(plt, ibands)
+    render.show("water_ibands_{0}".format(title))
 
-    z = np.column_stack((x, y))
+    z = cluster_points([mbands, ibands], lm)
 
     # k-means implementations
-    centroids, _ = kmeans(z, 2)
-    idx, _ = vq(z, centroids)
+    centroids = clusters(z, 2, seed)
+    idx = kmeans.assign(z, centroids)
+    if centroids_path:
+        save_centroids(centroids_path, centroids, WATER_LAYERS)
 
+    z, idx = plot_sample(z, idx, seed)
     plt.plot(
         z[idx == 0, 0], z[idx == 0, 1], 'ob',
         z[idx == 1, 0], z[idx == 1, 1], 'or')
 
     plt.plot(centroids[:, 0], centroids[:, 1], 'sg', markersize=8)
-    plt.show()
+    render.show("water_clusters_{0}".format(title))
 
-def color_clusters(ibands_image, mbands_image, fc_image, lm):
+def color_clusters(ibands_image, mbands_image, fc_image, lm, roi=CROP,
+                   seed=None, centroids_path=None):
     """
         Use k-means to clister the results and show the differences
         to define clouds, sea ice, land and ice clouds.
+
+        :params:
+            :param roi: window clustered, see tools.data.roi_index. None
+                        clusters the whole scene.
+            :param seed: integer seed of the k-means, see tools.kmeans
+            :param centroids_path: string with a .npz file to save the
+                                   centroids in, see find_water
     """
 
     MAX_NAN_PERCENTAGE = 10.00
@@ -155,32 +181,60 @@ def color_clusters(ibands_image, mbands_image, fc_image, lm):
                 image.filename, MAX_NAN_PERCENTAGE)
             sys.exit(1)
 
-    lm = lm.image()[2500:, range(2500, 3000)]
-
-    blue1 = ibands_image.image()[:, :, 2][2500:, range(2500, 3000)]
-    valid_mask = np.isfinite(blue1)
-    data_mask = valid_mask & ~lm
-    x = blue1[data_mask.astype(bool)]
-
-    blue2 = mbands_image.image()[:, :, 0][2500:, range(2500, 3000)]
-    valid_mask = np.isfinite(blue2)
-    data_mask = valid_mask & ~lm
-    y = blue2[data_mask.astype(bool)]
+    lm = lm.compact(roi=roi).astype(bool)
 
-    blue3 = fc_image.image()[:, :, 2][2500:, range(2500, 3000)]
-    valid_mask = np.isfinite(blue2)
-    data_mask = valid_mask & ~lm
-    z = blue3[data_mask.astype(bool)]
+    blue1 = ibands_image.channel('blue', roi=roi)
+    blue2 = mbands_image.channel('blue', roi=roi)
+    blue3 = fc_image.channel('blue', roi=roi)
 
-    blues = np.column_stack((x, y, z))
+    blues = cluster_points([blue1, blue2, blue3], lm)
 
-    centroids, _ = kmeans(blues, 3)
-    idx, _ = vq(blues, centroids)
+    centroids = clusters(blues, 3, seed)
+    idx = kmeans.assign(blues, centroids)
+    if centroids_path:
+        save_centroids(centroids_path, centroids, COLOR_LAYERS)
 
+    blues, idx = plot_sample(blues, idx, seed)
     plt.plot(
         blues[idx == 0, 0], blues[idx == 0, 1], 'ob',
         blues[idx == 1, 0], blues[idx == 1, 1], 'or',
         blues[idx == 2, 0], blues[idx == 2, 1], 'og')
     # plt.plot(centroids[:, 0], centroids[:, 1], 'sg', markersize=8)
     plt.plot(centroids[:, 0], centroids[:, 1], centroids[:, 2], 'sg', markersize=8)
-    plt.show()
+    render.show("color_clusters_{0}".format(ibands_image.title))
+
+
+def clusters(points, k, seed=None):
+    """
+        k-means centroids of points, exits when there aren't enough points
+        (e.g. a window that is all land or NaN).
+    """
+    try:
+        return kmeans.minibatch(points, k, seed=seed)
+    except ValueError, e:
+        print "{0}, check the window and the land mask".format(e)
+        sys.exit(1)
+
+
+def cluster_points(layers, lm):
+    """
+        Stack the pixels that are finite in every layer and aren't land as
+        the (pixels, layers) points to cluster, in float32 to keep the full
+        scene small.
+    """
+    data_mask = ~lm
+    for layer in layers:
+        data_mask &= np.isfinite(layer)
+    return np.column_stack(
+        [layer[data_mask].astype(np.float32) for layer in layers])
+
+
+def plot_sample(points, labels, seed=None):
+    """
+        At most PLOT_POINTS random points and their labels.
+    """
+    if len(points) <= PLOT_POINTS:
+        return points, labels
+    rng = np.random.RandomState(seed)
+    sample = rng.choice(len(points), PLOT_POINTS, replace=False)
+    return points[sample], labels[sample]
@@ -0,0 +1,203 @@
+# ============================================================================
+#
+#
+#                        Per-Granule Metrics Pipeline
+#
+#
+# ============================================================================
+#
+#   Streams the granules of the archive decoding each one once, and computes
+#   every requested per-granule metric in that single pass. Reports consume
+#   the rows instead of scanning the archive themselves:
+#
+#       rows = pipeline.collect(files, ['sic', 'border_overlap'], workers=8)
+#
+#   New metrics are added with the @metric decorator, they receive a Granule
+#   and return either a value (stored under the metric name) or a dict that
+#   is merged into the row.
+
+import functools
+from collections import OrderedDict
+
+from tools import data, pool, stats
+from app.models import LMImage as LM
+from app.models import SICImage as SIC
+
+# metric name -> (function, sensors it reads)
+METRICS = OrderedDict()
+
+
+def metric(name, sensors):
+    """
+        Register a per-granule metric.
+
+        :params:
+            :param name: string with the metric name
+            :param sensors: list of the sensors the metric reads, they are
+                            decoded together before any metric runs.
+    """
+    def register(func):
+        METRICS[name] = (func, tuple(sensors))
+        return func
+    return register
+
+
+class Granule(object):
+    """
+        The models of a single .mat file, sharing one decode of the sensors
+        the metrics need.
+    """
+
+    def __init__(self, filename, sensors=()):
+        self.filename = filename
+        self.sic = SIC(filename)
+        self.lm = LM(filename)
+        self.title = self.sic.title
+
+        if sensors:
+            data.sensors(self.sic.filepath, list(sensors))
+
+    def release(self):
+        self.sic.release()
+        self.lm.release()
+
+
+# ====================================================================
+#                            Metrics
+# ====================================================================
+
+
+@metric('sic', sensors=['mw_sic'])
+def sic_percentage(granule):
+    """
+        Sea ice and other percentages, see SICImage.percentage
+    """
+    percentages = granule.sic.percentage()
+    del percentages['timestamp']
+    return percentages
+
+
+@metric('land', sensors=['lm'])
+def land_percentage(granule):
+    return granule.lm.percentage()['lm']
+
+
+@metric('border_overlap', sensors=['mw_sic', 'lm'])
+def border_overlap(granule):
+    """
+        Percentage of the land mask border covered by sea ice, stored as
+        'intercept'.
+    """
+
+    ice = granule.sic.surface(packed=True)
+    overlap = (ice & granule.lm.border_mask()).count()
+    border = granule.lm.border_pixels()
+
+    return {'intercept': stats.percentage(overlap, border)}
+
+
+@metric('histogram', sensors=['mw_sic'])
+def sic_histogram(granule):
+    """
+        Sea ice concentration histogram and the number of pixels of mw_sic,
+        the extent at any level is derived from them (see extent()).
+    """
+    return {'histogram': granule.sic.histogram(),
+            'pixels': granule.sic.compact().size}
+
+
+@metric('nan', sensors=['mw_sic'])
+def nan_percentage(granule):
+    """
+        Percentage of NaN pixels in mw_sic
+    """
+    return granule.sic.nan_percentage()
+
+
+def extent(rows, levels):
+    """
+        Adds to each row with the 'histogram' metric an 'extent_<level>'
+        column per level with the percentage of ice above it.
+
+        :rType: list of the column names
+    """
+    for row in rows:
+        row.update(("extent_{0}".format(level), value) for level, value in
+                   stats.exceedance(row['histogram'], row['pixels'],
+                                    levels).iteritems())
+    return ["extent_{0}".format(level) for level in levels]
+
+
+# ====================================================================
+#                            Pipeline
+# ====================================================================
+
+
+def metric_sensors(metrics=None):
+    """
+        Sensors read by the metrics, all of them by default.
+
+        :rType: list
+    """
+    sensors = set()
+    for name in metrics or METRICS.keys():
+        sensors.update(METRICS[name][1])
+    return sorted(sensors)
+
+
+def compute(granule, metrics=None):
+    """
+        Compute metrics on a Granule whose sensors are already decoded.
+
+        :rType: dict(), with the granule 'timestamp' and the metrics
+    """
+    row = {'timestamp': granule.title}
+    for name in metrics or METRICS.keys():
+        value = METRICS[name][0](granule)
+        if isinstance(value, dict):
+            row.update(value)
+        else:
+            row[name] = value
+    return row
+
+
+def granule_metrics(filename, metrics=None):
+    """
+        Decode filename once and compute metrics on it.
+
+        :params:
+            :param filename: string with the granule file name
+            :param metrics: list of metric names, defaults to all of them
+
+        :rType: dict(), with the granule 'timestamp' and the metrics
+    """
+
+    granule = Granule(filename, metric_sensors(metrics))
+    try:
+        return compute(granule, metrics)
+    finally:
+        granule.release()
+
+
+def stream(files, metrics=None, workers=1):
+    """
+        Yields the metrics row of every granule in files, in the same order.
+
+        :params:
+            :param files: list of granule file names
+            :param metrics: list of metric names, defaults to all of them
+            :param workers: integer with the number of processes to use
+
+        :rType: Generator
+    """
+    func = functools.partial(granule_metrics, metrics=metrics)
+    return pool.imap_granules(func, files, workers)
+
+
+def collect(files, metrics=None, workers=1):
+    """
+        Same as stream but returns the rows in a list.
+
+        :rType: list
+    """
+    return list(stream(files, metrics, workers))
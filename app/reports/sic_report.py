@@ -10,14 +10,13 @@ import sys
 
 import numpy as np
 from pandas import DataFrame
-from scipy.stats import itemfreq
 from matplotlib import pyplot as plt
-from scipy.ndimage import filters, sobel
 
-from tools import data
+from tools import data, catalog, render, tiles
 from app.models import LMImage as LM
 from app.models import SICImage as SIC
-from app.reports.analysis import day_image, hist_match
+from app.reports import pipeline
+from app.reports.analysis import day_image, hist_match, ECDF
 
 
 # ====================================================================
@@ -34,68 +33,59 @@ def land_sic_overlap(lm_image, sic_image):
     lm = lm_image
     sic = sic_image
 
-    sic_surface = sic.surface(boolean=False)
-    lm_surface = lm.image()
-    condlist = [lm_surface == 1]
-    choicelist = [3]
-    merge = np.add(sic_surface, np.select(condlist, choicelist))
-    freqs = itemfreq(merge)
+    counts = sic.counts(land=lm.land_mask())
+
+    # Only drawn: 0 water, 1 ice, 3 land and 4 overlap, a byte per pixel
+    land = (lm.compact() == 1).view(np.uint8)
+    merge = sic.surface().view(np.uint8) + land * np.uint8(3)
 
     # Pie Chart config params
     labels = "Sea Water", "Sea Ice", "Land", "Land - Sea Ice Overlap"
     colors = ["blue", "lightblue", "yellow", "red"]
-    values = [freqs[0][1], freqs[1][1], freqs[2][1], freqs[3][1]]
+    values = [counts['other'], counts['ice'] - counts['overlap'],
+              counts['land'] - counts['overlap'], counts['overlap']]
 
     # Make and cofigure figure to be displayed
-    fig, axes = plt.subplots(1, 2)
+    fig, axes = render.subplots(1, 2)
 
     fig.subplots_adjust(hspace=0.3, wspace=0.05)
 
     #populate each axis of the figure
-    axes[0].imshow(merge)
+    render.imshow(axes[0], merge)
     axes[0].set_title("Sea Ice and Land Mask")
     axes[1].pie(values, explode=[0.1, 0.1, 0.1, 0.4], labels=labels,
                 colors=colors, shadow=True, autopct='%1.2f%%')
-    plt.show()
+    render.show("overlap_{0}".format(sic.title))
 
 
 def land_sic_overlap_timeseries(instrument,
-                                title="Land-Sea Ice Border Variations"):
+                                title="Land-Sea Ice Border Variations",
+                                workers=1, rows=None, start=None, end=None):
     """
         Time Series that shows the percentage variations of the land mask
         border given the expansion of sea ice in VIRS.
-    """
-
-    files = data.file_names(instrument_id=data.INSTRUMENT_MAP.get(instrument))
-    out = []
-
-    for idx, mat in enumerate(data.mat_generator(files)):
-
-        sic = SIC(files[idx])
-        lm = LM(files[idx])
-
-        sic_surface = sic.surface(boolean=False)
-        lm_surface = lm.silhoutte()
-
-        silhoutte_freq = itemfreq(lm_surface)
-        border = silhoutte_freq[1][1]
 
-        merge = np.add(sic_surface, lm_surface)
-        merge_freq = itemfreq(merge)
-        intercept = merge_freq[2][1]
+        :params:
+            :param workers: integer with the number of processes used to
+                            compute the granules, defaults to 1.
+            :param rows: list of rows from app.reports.pipeline that include
+                         the 'border_overlap' metric. When given the archive
+                         isn't scanned again.
+            :param start: seconds since the epoch of the first granule, see
+                          tools.catalog.granules
+            :param end: seconds since the epoch of the last granule
+    """
 
-        land_ice_overlap = (float(intercept) / border) * 100
-        temp = {'timestamp': lm.title, 'intercept': land_ice_overlap}
-        out.append(temp)
+    if rows is None:
+        files = catalog.files(instrument, start, end)
+        rows = pipeline.collect(files, ['border_overlap'], workers)
 
-    index = [elem['timestamp'] for elem in out]
-    df = DataFrame(out, index=index)
-    sdf = df.sort_values(by='timestamp')
-    sdf.plot(title=title)
-    plt.show()
+    plot_rows(rows, ['intercept'], title,
+              "{0}_border_time_series".format(instrument))
 
 
-def time_series(instrument='vir', title="SIC Percentage Changes"):
+def time_series(instrument='vir', title="SIC Percentage Changes", workers=1,
+                rows=None, start=None, end=None, levels=None):
     """
         Show the change over time in sea ice conectration level by displaying
         a graph of the percentage change over time in sea ice concentration.
@@ -103,22 +93,45 @@ def time_series(instrument='vir', title="SIC Percentage Changes"):
         :params:
             :param instrument: use the tools/data.py map to choose the right
                                instrument. defaults to vir.
+            :param workers: integer with the number of processes used to
+                            compute the granules, defaults to 1.
+            :param rows: list of rows from app.reports.pipeline that include
+                         the 'sic' metric. When given the archive isn't
+                         scanned again.
+            :param start: seconds since the epoch of the first granule, see
+                          tools.catalog.granules
+            :param end: seconds since the epoch of the last granule
+            :param levels: integer ice concentration levels, when given the
+                           series are the extent above each level (the rows
+                           need the 'histogram' metric) instead of ice and
+                           other.
     """
 
-    # VIRS or Modis files
-    files = data.file_names(instrument_id=data.INSTRUMENT_MAP[instrument])
+    metric = 'histogram' if levels else 'sic'
+    if rows is None:
+        # VIRS or Modis files
+        files = catalog.files(instrument, start, end)
+        rows = pipeline.collect(files, [metric], workers)
 
-    out = []
+    if levels:
+        columns = pipeline.extent(rows, levels)
+    else:
+        columns = ['ice', 'other']
 
-    for idx, mat in enumerate(data.mat_generator(files)):
-        sic = SIC(files[idx])
-        out.append(sic.percentage())
+    plot_rows(rows, columns, title, "{0}_sic_time_series".format(instrument))
 
-    index = [elem['timestamp'] for elem in out]
-    df = DataFrame(out, index=index)
+
+def plot_rows(rows, columns, title, name):
+    """
+        Plot columns of the pipeline rows as a time series, name is the file
+        name used when rendering to files (see tools.render).
+    """
+    index = [elem['timestamp'] for elem in rows]
+    df = DataFrame(rows, index=index, columns=['timestamp'] + columns)
     sdf = df.sort_values(by='timestamp')
-    sdf.plot(title=title)
-    plt.show()
+    _, axes = render.subplots()
+    sdf.plot(title=title, ax=axes)
+    render.show(name)
 
 
 def surface_analysis(sic_image, save=False, path=None):
@@ -138,25 +151,26 @@ def surface_analysis(sic_image, save=False, path=None):
 
     seaice_surface = sic.surface()
 
-    figure = plt.figure()
+    figure = render.figure()
     figure.suptitle(
         "Sea Ice concentration and Surface for {0}".format(sic.filename))
 
     original = plt.subplot(pos1)
     original.set_title("{0}".format(sic.title))
-    org = original.imshow(sic.image())
+    org = render.imshow(original, sic.image())
     figure.colorbar(org, orientation="vertical")
 
     sea_ice_surface = plt.subplot(pos2)
     sea_ice_surface.set_title("Sea Ice Surface".format(sic.title))
-    sea_ice_surface.imshow(seaice_surface)
+    render.imshow(sea_ice_surface, seaice_surface)
 
     silhoutte = plt.subplot(pos3)
     silhoutte.set_title("Generic Laplace - Ice silhoutte")
-    silhoutte.imshow(
-        filters.generic_laplace(seaice_surface, sobel), cmap='Greys_r')
+    render.imshow(
+        silhoutte, tiles.laplace_sobel(seaice_surface),
+        cmap='Greys_r')
 
-    plt.show()
+    render.show("surface_{0}".format(sic.title))
 
 
 def silhoutte(img):
@@ -167,19 +181,20 @@ def silhoutte(img):
 
     if isinstance(img, SIC):
         seaice_surface = img.surface()
-        im = filters.generic_laplace(seaice_surface, sobel)
+        im = tiles.laplace_sobel(seaice_surface)
         #TODO: The output can be more clear, we need to find a filter that
         #      better connects the edges of the output.
-        plt.imshow(im, cmap='Greys_r')
+        render.imshow(plt, im, cmap='Greys_r')
         plt.title('Sea Ice Concentration (mw_sic) silhoutte')
     elif isinstance(img, LM):
-        plt.imshow(img.silhoutte(), cmap='Greys', interpolation='nearest')
+        render.imshow(
+            plt, img.silhoutte(), cmap='Greys', interpolation='nearest')
         plt.title('Land Mask (lm) silhoutte')
     else:
         print "The image passed is not SICImage or LMImage"
         sys.exit(1)
 
-    plt.show()
+    render.show("silhoutte_{0}_{1}".format(img.SENSOR, img.title))
 
 
 def distribution(img):
@@ -210,7 +225,7 @@ def distribution(img):
         sys.exit(1)
 
     plt.axis('equal')
-    plt.show()
+    render.show("distribution_{0}_{1}".format(img.SENSOR, img.title))
 
 
 # ====================================================================
@@ -228,41 +243,44 @@ def unified_day_image(lense, interval=20):
                              interval is in minutes.
     """
 
-    virs_files = data.file_names(data.INSTRUMENT_MAP.get('vir'))
-    modis_files = data.file_names(data.INSTRUMENT_MAP.get('mod'))
+    virs_files = catalog.files('vir')
+    modis_files = catalog.files('mod')
 
     processed = list()
     titles = list()
 
-    for idx, vir in enumerate(virs_files):
+    # Several VIRS granules can share their closest MODIS granule, keep the
+    # template CDFs around instead of loading it again.
+    templates = dict()
 
-        if idx >= len(virs_files):
-            break
+    pairs = data.temporal_join(virs_files, modis_files, interval, nearest=True)
+    for vir, mod in pairs:
+        source = SIC(vir)
+        template = SIC(mod)
 
-        virs_date = data.parse_date(vir)
-        modis_date = data.parse_date(modis_files[idx])
+        if mod not in templates:
+            templates[mod] = ECDF(template.image())
+            template.release()
 
-        if data.date_dff(virs_date, modis_date) <= interval:
-            source = SIC(virs_files[idx])
-            template = SIC(modis_files[idx])
+        out = hist_match(source.image(), templates[mod])
+        source.release()
 
-            out = hist_match(source.image(), template.image())
-            processed.append(out)
-            titles.append("{0} and {1}".format(source.title, template.title))
+        processed.append(out)
+        titles.append("{0} and {1}".format(source.title, template.title))
 
     # Make and cofigure figure to be displayed
     if len(processed) == 0:
         print "No pictures were processed, consider changing the interval"
         sys.exit(0)
     elif len(processed) == 1:
-        plt.imshow(processed[0])
+        render.imshow(plt, processed[0])
     else:
         boxes = len(processed)
         if boxes % 2 > 0:
             boxes = boxes + 1
         levels = boxes / 2
 
-        fig, axes = plt.subplots(levels, 2)
+        fig, axes = render.subplots(levels, 2)
         fig.subplots_adjust(hspace=0.5, wspace=0.2)
         fig.suptitle(
             "VIRS-MODIS Hist. Matched {0} mins apart with {1} images".format(
@@ -271,21 +289,20 @@ def unified_day_image(lense, interval=20):
 
         if len(processed) <= 2:
             for idx, img in enumerate(processed):
-                axes[idx].imshow(processed[idx])
+                render.imshow(axes[idx], processed[idx])
                 axes[idx].set_title(titles[idx])
         else:
             idx = 0
             for level in range(levels):
                 for box in range(2):
                     if idx < len(processed):
-                        axes[level][box].imshow(processed[idx])
-                        axes[level][box].set_title(
-                            "{0} and {1}l".format(titles[idx], tiltes[idx]))
+                        render.imshow(axes[level][box], processed[idx])
+                        axes[level][box].set_title(titles[idx])
                         idx += 1
                     else:
                         break
 
-    plt.show()
+    render.show("unified_day_image_{0}".format(lense))
 
 
 def show_day_images_by_instrument():
@@ -297,13 +314,13 @@ def show_day_images_by_instrument():
     modis = day_image(instrument='mod', lense="mw_sic")
 
     # Make and cofigure figure to be displayed
-    fig, axes = plt.subplots(1, 2)
+    fig, axes = render.subplots(1, 2)
     fig.subplots_adjust(hspace=0.3, wspace=0.05)
 
     #populate each axis of the figure
-    axes[0].imshow(virs)
+    render.imshow(axes[0], virs)
     axes[0].set_title("VIRS")
-    axes[1].imshow(modis)
+    render.imshow(axes[1], modis)
     axes[1].set_title("MODIS")
 
-    plt.show()
+    render.show("day_images")
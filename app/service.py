@@ -0,0 +1,342 @@
+# ============================================================================
+#
+#
+#                         Local Analysis Service
+#
+#
+# ============================================================================
+#
+#   HTTP/JSON service over the local data directory (python app.py --serve
+#   8000). The catalog is loaded once and decoded sensors stay in the granule
+#   cache between requests, so asking about the same granules again doesn't
+#   read them from disk. Requests are handled in threads.
+#
+#       GET /granules?instrument=vir&start=2015_336_0600&end=2015_336_1800
+#       GET /sic/<granule>?levels=15,40,85
+#       GET /lm/<granule>
+#       GET /overlap/<granule>[?format=png]
+#       GET /histmatch?source=<granule>&template=<granule>&sensor=mw_sic
+#           [&format=png]
+#       GET /metrics
+#
+#   /metrics returns the number of requests, errors and latencies (ms) of
+#   every endpoint and the statistics of the granule cache.
+
+import json
+import time
+import threading
+import traceback
+from urlparse import urlparse, parse_qs
+from collections import deque, OrderedDict
+from SocketServer import ThreadingMixIn
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+from matplotlib import pyplot as plt
+
+from tools import catalog, data, render, stats
+from tools.cache import GRANULE_CACHE
+from app.models import MODELS, LMImage, SICImage
+from app.reports.analysis import ECDF, hist_match
+from app.reports.sic_report import land_sic_overlap
+
+# Latencies kept per endpoint for the percentiles
+LATENCY_WINDOW = 1000
+
+# endpoint name -> function(granule or None, params)
+ENDPOINTS = OrderedDict()
+
+# Figures are drawn on the process-wide pyplot state, one at a time
+_RENDER_LOCK = threading.Lock()
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status, message):
+        super(HTTPError, self).__init__(message)
+        self.status = status
+
+
+def endpoint(name):
+    def register(func):
+        ENDPOINTS[name] = func
+        return func
+    return register
+
+
+class Catalog(object):
+    """
+        The granules of the catalog kept in memory, reloaded with
+        /granules?refresh=1
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        catalog.refresh()
+        entries = catalog.granules('both')
+        with self._lock:
+            self.entries = entries
+            self.names = set(g['filename'] for g in entries)
+
+    def granules(self, instrument='both', start=None, end=None):
+        code = data.INSTRUMENT[data.INSTRUMENT_MAP[instrument.lower()]]
+        with self._lock:
+            entries = list(self.entries)
+        return [g for g in entries
+                if (code == data.INSTRUMENT[2] or g['instrument'] == code) and
+                (start is None or g['timestamp'] >= start) and
+                (end is None or g['timestamp'] <= end)]
+
+    def check(self, filename):
+        if filename not in self.names:
+            raise HTTPError(404, "Unknown granule {0}".format(filename))
+        return filename
+
+
+class Latency(object):
+    """
+        Requests, errors and recent latencies of every endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = OrderedDict()
+
+    def record(self, name, seconds, error=False):
+        with self._lock:
+            entry = self._endpoints.setdefault(name, {
+                'requests': 0, 'errors': 0,
+                'latencies': deque(maxlen=LATENCY_WINDOW)})
+            entry['requests'] += 1
+            entry['errors'] += int(error)
+            entry['latencies'].append(seconds * 1000)
+
+    def summary(self):
+        with self._lock:
+            endpoints = [
+                (name, dict(entry, latencies=list(entry['latencies'])))
+                for name, entry in self._endpoints.iteritems()]
+
+        out = OrderedDict()
+        for name, entry in endpoints:
+            latencies = np.array(entry['latencies'])
+            out[name] = {
+                'requests': entry['requests'],
+                'errors': entry['errors'],
+                'mean_ms': float(latencies.mean()),
+                'p50_ms': float(np.percentile(latencies, 50)),
+                'p95_ms': float(np.percentile(latencies, 95)),
+                'max_ms': float(latencies.max()),
+            }
+        return out
+
+
+CATALOG = None
+LATENCY = Latency()
+
+
+# ====================================================================
+#                            Endpoints
+# ====================================================================
+
+
+def param(params, name, default=None):
+    return params.get(name, [default])[0]
+
+
+def png(figures):
+    if not figures:
+        raise HTTPError(500, "The report didn't draw a figure")
+    return 'image/png', figures[-1]
+
+
+@endpoint('granules')
+def granules(granule, params):
+    if param(params, 'refresh'):
+        CATALOG.reload()
+
+    try:
+        start = param(params, 'start')
+        end = param(params, 'end')
+        start = data.date_timestamp(start) if start else None
+        end = data.date_timestamp(end) if end else None
+        return CATALOG.granules(param(params, 'instrument', 'both'),
+                                start, end)
+    except (KeyError, ValueError), e:
+        raise HTTPError(400, "Bad instrument or date: {0}".format(e))
+
+
+@endpoint('sic')
+def sic(granule, params):
+    image = SICImage(CATALOG.check(granule))
+    out = image.percentage()
+    out['nan'] = image.nan_percentage()
+
+    levels = param(params, 'levels')
+    if levels:
+        try:
+            levels = [int(level) for level in levels.split(',')]
+            extent = image.extent(levels)
+        except ValueError:
+            raise HTTPError(400, "levels must be integers between 0 and 100")
+        out['extent'] = dict((str(level), value) for level, value in
+                             extent.iteritems())
+    return out
+
+
+@endpoint('lm')
+def lm(granule, params):
+    image = LMImage(CATALOG.check(granule))
+    out = image.percentage()
+    out['timestamp'] = image.title
+    return out
+
+
+@endpoint('overlap')
+def overlap(granule, params):
+    lm = LMImage(CATALOG.check(granule))
+    sic = SICImage(granule)
+
+    if param(params, 'format') == 'png':
+        with _RENDER_LOCK:
+            with render.captured('png') as figures:
+                land_sic_overlap(lm, sic)
+        return png(figures)
+
+    counts = sic.counts(land=lm.land_mask())
+    border = (sic.surface(packed=True) & lm.border_mask()).count()
+    return {
+        'timestamp': sic.title,
+        'sea_water': stats.percentage(counts['other'], counts['total']),
+        'sea_ice': stats.percentage(counts['ice'] - counts['overlap'],
+                                    counts['total']),
+        'land': stats.percentage(counts['land'] - counts['overlap'],
+                                 counts['total']),
+        'overlap': stats.percentage(counts['overlap'], counts['total']),
+        'intercept': stats.percentage(border, lm.border_pixels()),
+    }
+
+
+@endpoint('histmatch')
+def histmatch(granule, params):
+    sensor = param(params, 'sensor', 'mw_sic')
+    if sensor not in MODELS or MODELS[sensor] not in (SICImage, LMImage):
+        raise HTTPError(400, "Histogram matching supports mw_sic and lm")
+
+    source = param(params, 'source')
+    template = param(params, 'template')
+    if not source or not template:
+        raise HTTPError(400, "source and template granules are required")
+
+    source = MODELS[sensor](CATALOG.check(source))
+    template = MODELS[sensor](CATALOG.check(template))
+    template_cdf = ECDF(template.image())
+    matched, count = hist_match(source.image(), template_cdf,
+                                full_output=True)
+
+    if param(params, 'format') == 'png':
+        with _RENDER_LOCK:
+            with render.captured('png') as figures:
+                render.imshow(plt, matched)
+                plt.title("Histogram Matching for:\n{0} and {1}".format(
+                    source.filename, template.filename))
+                render.show("hist_{0}".format(sensor))
+        return png(figures)
+
+    finite = matched[np.isfinite(matched)]
+    ks = ECDF(matched).ks_distance(template_cdf)[0]
+    return {
+        'source': source.filename,
+        'template': template.filename,
+        'sensor': sensor,
+        'pixels': int(count),
+        'ks': None if np.isnan(ks) else ks,
+        'mean': float(finite.mean()) if finite.size else None,
+        'percentiles': dict(
+            (str(q), float(v)) for q, v in
+            zip((5, 25, 50, 75, 95),
+                np.percentile(finite, (5, 25, 50, 75, 95))))
+        if finite.size else None,
+    }
+
+
+@endpoint('metrics')
+def metrics(granule, params):
+    return {
+        'endpoints': LATENCY.summary(),
+        'cache': GRANULE_CACHE.stats(),
+        'granules': len(CATALOG.names),
+    }
+
+
+# ====================================================================
+#                              Server
+# ====================================================================
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split('/') if p]
+        name = parts[0] if parts else ''
+        granule = parts[1] if len(parts) > 1 else None
+
+        start = time.time()
+        error = True
+        try:
+            if name not in ENDPOINTS or len(parts) > 2:
+                raise HTTPError(404, "Unknown endpoint {0}".format(url.path))
+
+            result = ENDPOINTS[name](granule, parse_qs(url.query))
+            if isinstance(result, tuple):
+                self.send(200, *result)
+            else:
+                self.send(200, 'application/json', json.dumps(result))
+            error = False
+        except HTTPError, e:
+            self.send_json_error(e.status, str(e))
+        except (Exception, SystemExit), e:
+            traceback.print_exc()
+            self.send_json_error(500, "{0}: {1}".format(type(e).__name__, e))
+        finally:
+            LATENCY.record(name if name in ENDPOINTS else 'unknown',
+                           time.time() - start, error)
+
+    def send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json_error(self, status, message):
+        self.send(status, 'application/json', json.dumps({'error': message}))
+
+    def log_message(self, fmt, *args):
+        print "{0} - {1}".format(self.address_string(), fmt % args)
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def serve(port, host='127.0.0.1'):
+    """
+        Serve the endpoints on host:port until interrupted.
+    """
+    global CATALOG
+    CATALOG = Catalog()
+
+    server = Server((host, port), Handler)
+    print "Serving {0} granules on http://{1}:{2}/".format(
+        len(CATALOG.names), host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print "Stopped"
+    finally:
+        server.server_close()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+# ============================================================================
+#
+#   Benchmarks of the hot paths on synthetic granules (see granules.py). Each
+#   benchmark runs in its own process so its peak memory (the maximum
+#   resident set size) isn't mixed with the others. Results are written as
+#   JSON and can be compared with a previous run:
+#
+#       python scripts/benchmark.py -o before.json
+#       python scripts/benchmark.py -o after.json --compare before.json
+#
+# ============================================================================
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from timeit import default_timer
+from collections import OrderedDict
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, os.path.abspath(ROOT))
+
+import numpy as np
+
+import granules
+from tools import data, render, static
+
+REPEAT = 5
+
+# Figures of the benchmarks that render, a temporary directory set by main
+RENDER_DIR = None
+
+# benchmark name -> function(files) returning the callable to time, or a
+# (callable, reset) tuple where reset runs untimed before every repeat
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def path(filename):
+    return os.path.join(data.DATA_DIR, filename)
+
+
+# ====================================================================
+#                            Benchmarks
+# ====================================================================
+
+
+@benchmark('mat_file')
+def mat_file(files):
+    return lambda: data.mat_file(path(files[0]))
+
+
+@benchmark('mat_file_sensor')
+def mat_file_sensor(files):
+    return lambda: data.mat_file(path(files[0]), ['mw_sic'])
+
+
+@benchmark('ecdf')
+def ecdf(files):
+    from app.models import SICImage
+    from app.reports.analysis import ecdf
+
+    image = SICImage(files[0]).image()
+    return lambda: ecdf(image)
+
+
+@benchmark('hist_match')
+def hist_match(files):
+    from app.models import SICImage
+    from app.reports.analysis import hist_match
+
+    source = SICImage(files[0]).image()
+    template = SICImage(files[-1]).image()
+    return lambda: hist_match(source, template)
+
+
+@benchmark('histmatch_plot')
+def histmatch_plot(files):
+    from app.models import SICImage
+    from app.reports.analysis import histmatch_plot
+
+    source = SICImage(files[0])
+    template = SICImage(files[-1])
+    source.compact()
+    template.compact()
+
+    render.configure(RENDER_DIR)
+    return lambda: histmatch_plot(source, template)
+
+
+@benchmark('sic_percentage')
+def sic_percentage(files):
+    from app.models import SICImage
+
+    sic = SICImage(files[0])
+    sic.compact()
+    return sic.percentage
+
+
+@benchmark('border_overlap')
+def border_overlap(files):
+    from app.models import LMImage, SICImage
+
+    sic = SICImage(files[0])
+    sic.compact()
+    lm = LMImage(files[0])
+    lm.border_mask()
+    return lambda: (sic.surface(packed=True) & lm.border_mask()).count()
+
+
+@benchmark('lm_silhoutte')
+def lm_silhoutte(files):
+    from app.models import LMImage
+
+    lm = LMImage(files[0])
+    lm.compact()
+
+    def reset():
+        # Products are memoized in memory and on disk (under the temporary
+        # data directory), compute them again
+        static.clear()
+        shutil.rmtree(os.path.dirname(static.product_path(lm.digest(), '')),
+                      ignore_errors=True)
+
+    return lm.silhoutte, reset
+
+
+@benchmark('channel')
+def channel(files):
+    from app.models import IbandImage
+
+    # Decoding the sensor included, it's dropped from the cache every time
+    ibands = IbandImage(files[0])
+    return lambda: ibands.channel('blue'), ibands.release
+
+
+@benchmark('channel_roi')
+def channel_roi(files):
+    from app.models import IbandImage
+
+    ibands = IbandImage(files[0])
+    rows, cols = ibands.raw().shape[1:]
+    roi = ((rows // 2, None), (cols // 4, cols // 2))
+    return lambda: ibands.channel('blue', roi=roi)
+
+
+@benchmark('color_clusters')
+def color_clusters(files):
+    from app.models import FcImage, IbandImage, LMImage, MbandImage
+    from app.reports.color_report import color_clusters
+
+    images = [IbandImage(files[0]), MbandImage(files[0]), FcImage(files[0])]
+    for image in images:
+        image.raw()
+    lm = LMImage(files[0])
+
+    render.configure(RENDER_DIR)
+    return lambda: color_clusters(images[0], images[1], images[2], lm,
+                                  roi=None, seed=0)
+
+
+# ====================================================================
+#                             Runner
+# ====================================================================
+
+
+def max_rss_kb():
+    """
+        Peak resident set size of this process in KiB (Linux units).
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(name, directory, files, repeat, results):
+    """
+        Run a benchmark, in a child process, and put its result in results.
+    """
+
+    data.DATA_DIR = directory
+
+    prepared = BENCHMARKS[name](files)
+    run, reset = prepared if isinstance(prepared, tuple) else (prepared, None)
+
+    rss_before = max_rss_kb()
+    seconds = []
+    for _ in xrange(repeat):
+        if reset:
+            reset()
+        start = default_timer()
+        run()
+        seconds.append(default_timer() - start)
+
+    rss_after = max_rss_kb()
+    results.put({
+        'seconds': seconds,
+        'best': min(seconds),
+        'median': float(np.median(seconds)),
+        'peak_rss_kb': rss_after,
+        'peak_increase_kb': rss_after - rss_before,
+    })
+
+
+def run_benchmarks(names, directory, files, repeat=REPEAT):
+    """
+        Run every benchmark in names in its own process.
+
+        :rType: OrderedDict name -> result
+    """
+
+    results = OrderedDict()
+    for name in names:
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=measure, args=(name, directory, files, repeat, queue))
+        process.start()
+        process.join()
+
+        if process.exitcode != 0 or queue.empty():
+            print "{0:<18} failed".format(name)
+            results[name] = {'error': process.exitcode}
+            continue
+
+        results[name] = queue.get()
+        print "{0:<18} best {1:9.4f}s  median {2:9.4f}s  peak {3:8d} KiB " \
+              "(+{4} KiB)".format(name, results[name]['best'],
+                                  results[name]['median'],
+                                  results[name]['peak_rss_kb'],
+                                  results[name]['peak_increase_kb'])
+    return results
+
+
+def compare(results, previous):
+    """
+        Print the best times of results against a previous run.
+    """
+    print "\n{0:<18} {1:>10} {2:>10} {3:>8}".format(
+        "benchmark", "before", "after", "ratio")
+    for name, result in results.iteritems():
+        before = previous.get(name, {}).get('best')
+        after = result.get('best')
+        if before is None or after is None:
+            continue
+        print "{0:<18} {1:10.4f} {2:10.4f} {3:7.2f}x".format(
+            name, before, after, before / after if after else float('inf'))
+
+
+def revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Ross Sea benchmarks")
+    parser.add_argument(
+        'benchmarks', nargs='*',
+        help="Benchmarks to run, all of them by default: {0}".format(
+            ", ".join(BENCHMARKS)))
+    parser.add_argument(
+        '--output', '-o', action='store', dest='output',
+        default='benchmark.json', help="JSON file of the results")
+    parser.add_argument(
+        '--compare', action='store', dest='compare',
+        help="JSON file of a previous run to compare with")
+    parser.add_argument(
+        '--data', action='store', dest='data',
+        help="Directory with granules to use instead of synthetic ones, "
+             "nothing is written in it")
+    parser.add_argument('--rows', type=int, default=granules.ROWS)
+    parser.add_argument('--cols', type=int, default=granules.COLS)
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    args = parser.parse_args()
+
+    names = args.benchmarks or BENCHMARKS.keys()
+    for name in names:
+        if name not in BENCHMARKS:
+            print "Unknown benchmark {0}".format(name)
+            sys.exit(1)
+
+    global RENDER_DIR
+    work = tempfile.mkdtemp(prefix='benchmark_')
+    RENDER_DIR = os.path.join(work, 'render')
+    directory = os.path.join(work, 'granules')
+    try:
+        if args.data:
+            # The granules are linked into the temporary directory, the store
+            # and the static products written by the benchmarks go there
+            # instead of next to the archive.
+            files = sorted(f for f in os.listdir(args.data)
+                           if f.endswith('.mat'))
+            os.makedirs(directory)
+            for f in files:
+                os.symlink(os.path.abspath(os.path.join(args.data, f)),
+                           os.path.join(directory, f))
+        else:
+            print "Generating {0}x{1} granules in {2}".format(
+                args.rows, args.cols, directory)
+            files = granules.generate(directory, (args.rows, args.cols))
+
+        results = run_benchmarks(names, directory, files, args.repeat)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    report = {
+        'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'revision': revision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'shape': None if args.data else [args.rows, args.cols],
+        'granules': files,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print "Results saved in {0}".format(args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)['results'])
+
+
+if __name__ == '__main__':
+    main()
@@ -1,42 +1,254 @@
+#!/usr/bin/env python
+# ============================================================================
+#
+#   Download the granules of one or more days from the granule server. Files
+#   are downloaded in parallel, each thread reusing its own connection, and
+#   streamed into a '.part' file that is renamed when it's complete. Files
+#   that already exist with the size of the server are skipped, interrupted
+#   downloads are resumed with HTTP Range requests and failed requests are
+#   retried with an exponential backoff.
+#
+#       python scripts/data_download.py 2015_336
+#       python scripts/data_download.py 2015_336:2015_340 --workers 8
+#       python scripts/data_download.py 2015_336 --url http://localhost:8000/
+#
+#   The --url of a local server serving a directory per day (e.g. python -m
+#   SimpleHTTPServer) can be used to test it, see tests/test_data_download.py.
+#
+# ============================================================================
+
 import os
 import sys
+import time
+import argparse
+import datetime
+import threading
+from multiprocessing.pool import ThreadPool
 
 import requests
 from bs4 import BeautifulSoup
 
-base_url = "http://csdirs.ccny.cuny.edu/u/gib/rohit/2015_336/"
-data_path = os.path.join(os.pardir, "data")
+BASE_URL = "http://csdirs.ccny.cuny.edu/u/gib/rohit/"
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        os.pardir, "data")
+
+CHUNK_SIZE = 1024 * 1024
+RETRIES = 5
+BACKOFF = 1.0
+TIMEOUT = 60
+
+_LOCAL = threading.local()
+
+
+def session():
+    """
+        The requests.Session of the current thread, so every thread reuses its
+        own connection.
+    """
+    if not hasattr(_LOCAL, 'session'):
+        _LOCAL.session = requests.Session()
+    return _LOCAL.session
+
+
+def days(day_args):
+    """
+        Expand the day arguments, 'YYYY_DDD' or a 'YYYY_DDD:YYYY_DDD' range
+        (both included), to the list of day directory names.
+
+        :rType: list
+    """
+    names = []
+    for arg in day_args:
+        first, _, last = arg.partition(':')
+        day = datetime.datetime.strptime(first, "%Y_%j")
+        end = datetime.datetime.strptime(last or first, "%Y_%j")
+        while day <= end:
+            names.append(day.strftime("%Y_%j"))
+            day += datetime.timedelta(days=1)
+    return names
+
+
+def granule_names(day_url):
+    """
+        Returns the granule file names listed in the day directory page.
+
+        :rType: list
+    """
+    req = retry(lambda: session().get(day_url, timeout=TIMEOUT))
+    soup = BeautifulSoup(req.text, 'html.parser')
+
+    filenames = list()
+    for link in soup.find_all('a'):
+        href = link.get('href') or ''
+        if href[:3] == 'G_2':
+            filenames.append(href)
+    return filenames
+
+
+def retry(request, retries=RETRIES, backoff=BACKOFF):
+    """
+        Call request until it returns a successful response, waiting backoff
+        seconds after the first failure and doubling the wait after every
+        other one.
+
+        :rType: requests.Response
+    """
+    for attempt in xrange(retries + 1):
+        try:
+            req = request()
+            req.raise_for_status()
+            return req
+        except requests.RequestException, e:
+            if attempt == retries or not retryable(e):
+                raise
+            print "Retrying after error: {0}".format(e)
+            time.sleep(backoff * 2 ** attempt)
+
+
+def retryable(error):
+    """
+        False for the HTTP errors that won't change by asking again, like a
+        missing file. Connection errors, server errors (5xx) and 429 Too Many
+        Requests are retried.
+    """
+    response = getattr(error, 'response', None)
+    if isinstance(error, requests.HTTPError) and response is not None:
+        return response.status_code >= 500 or response.status_code == 429
+    return True
+
+
+def remote_size(url, retries=RETRIES, backoff=BACKOFF):
+    """
+        Size of the file in url in bytes, None if the server doesn't say.
+    """
+    req = retry(lambda: session().head(url, timeout=TIMEOUT,
+                                       allow_redirects=True),
+                retries, backoff)
+    length = req.headers.get('Content-Length')
+    return int(length) if length is not None else None
+
+
+def download(url, path, retries=RETRIES, backoff=BACKOFF):
+    """
+        Download url into path through path.part, resuming a previous partial
+        download of it.
+
+        :rType: string, 'skipped' or 'downloaded'
+    """
+
+    size = remote_size(url, retries, backoff)
+    if size is not None and os.path.isfile(path) and \
+            os.path.getsize(path) == size:
+        return 'skipped'
+
+    part = path + '.part'
+
+    for attempt in xrange(retries + 1):
+        try:
+            _fetch(url, part, size)
+            break
+        except (requests.RequestException, IOError), e:
+            if attempt == retries or not retryable(e):
+                raise
+            print "Retrying {0} after error: {1}".format(url, e)
+            time.sleep(backoff * 2 ** attempt)
+
+    os.rename(part, path)
+    return 'downloaded'
+
+
+def _fetch(url, part, size):
+    """
+        Stream url into the part file, continuing from the bytes it already
+        has when the server supports Range requests.
+    """
+
+    offset = os.path.getsize(part) if os.path.isfile(part) else 0
+    if size is not None and offset > size:
+        offset = 0
+    if size is not None and offset == size:
+        return
+
+    headers = {'Range': "bytes={0}-".format(offset)} if offset else {}
+    req = session().get(url, headers=headers, stream=True, timeout=TIMEOUT)
+    try:
+        req.raise_for_status()
+
+        # 206 continues the part file, any other answer is the whole file
+        mode = 'ab' if req.status_code == 206 else 'wb'
+        with open(part, mode) as f:
+            for chunk in req.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+    finally:
+        req.close()
+
+    received = os.path.getsize(part)
+    if size is not None and received != size:
+        raise IOError("{0} has {1} of {2} bytes".format(part, received, size))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Download granules")
+    parser.add_argument(
+        'days', nargs='+',
+        help="Days to download, YYYY_DDD or a YYYY_DDD:YYYY_DDD range")
+    parser.add_argument(
+        '--url', action='store', dest='url', default=BASE_URL,
+        help="Server directory with a directory per day")
+    parser.add_argument(
+        '--output', '-o', action='store', dest='output', default=DATA_DIR,
+        help="Directory the granules are saved in")
+    parser.add_argument(
+        '--workers', action='store', dest='workers', type=int, default=4,
+        help="Number of files downloaded at the same time")
+    parser.add_argument(
+        '--retries', action='store', dest='retries', type=int,
+        default=RETRIES, help="Attempts after the first failed one")
+    args = parser.parse_args()
+
+    base_url = args.url if args.url.endswith('/') else args.url + '/'
 
-req = requests.get(base_url)
-html_doc = req.text
+    if not os.path.exists(args.output):
+        print "Creating Data Dir"
+        os.makedirs(args.output)
 
-soup = BeautifulSoup(html_doc, 'html.parser')
+    urls = []
+    failed_days = 0
+    for day in days(args.days):
+        day_url = "{0}{1}/".format(base_url, day)
+        try:
+            urls.extend(day_url + name for name in granule_names(day_url))
+        except requests.RequestException, e:
+            print "Can't list {0}: {1}".format(day_url, e)
+            failed_days += 1
 
-links = soup.find_all('a')
+    print "Preparing to download files {0}...".format(len(urls))
 
-filenames = list()
-for link in links:
-    if link.get('href')[:3] == 'G_2':
-        filenames.append(link.get('href'))
+    def run(url):
+        filename = url.rsplit('/', 1)[-1]
+        path = os.path.join(args.output, filename)
+        try:
+            status = download(url, path, args.retries)
+        except (requests.RequestException, IOError, OSError), e:
+            status = "failed: {0}".format(e)
+        print "{0} {1}".format(filename, status)
+        return status
 
-# Download files
-print "Preparing to download files {0}...".format(len(filenames))
-for filename in filenames:
-    path = os.path.join(os.getcwd(), data_path)
+    pool = ThreadPool(max(1, args.workers))
+    try:
+        statuses = pool.map(run, urls)
+    finally:
+        pool.close()
+        pool.join()
 
-    if not os.path.exists(path):
-        print "Creating Data Dir".format(filename)
-        os.makedirs(path)
-        print "Created Data Dir".format(filename)
+    failed = len([s for s in statuses if s.startswith('failed')])
+    if failed or failed_days:
+        print "Done, {0} of {1} files and {2} days failed".format(
+            failed, len(urls), failed_days)
+        sys.exit(1)
+    print "Done, files downloaded!"
 
-    with open(os.path.join(path, filename), 'wb') as f:
-        print "Saving {0} ...".format(filename)
-        url = base_url + filename
-        req = requests.get(url, stream=True)
-        if not req.ok:
-            print "Somethiing went wrong"
-            sys.exit(0)
-        f.write(req.content)
-        print "Saved {0} ...".format(filename)
 
-print "Done, files downloaded!"
+if __name__ == '__main__':
+    main()
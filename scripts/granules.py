@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# ============================================================================
+#
+#   Synthetic granules with the layout of the real ones: the same file name
+#   convention, the 2-D sensors as (rows, cols) doubles and the band sensors
+#   as (bands, rows, cols) doubles. Fields are spatially smooth, the land
+#   mask is a coast along the bottom of the scene and every sensor has rows
+#   of missing scans (NaN), so the analysis code goes through the same paths
+#   as with real data.
+#
+#       python scripts/granules.py /tmp/granules --rows 2000 --cols 2400
+#
+# ============================================================================
+
+import os
+import argparse
+
+import numpy as np
+from scipy.io import savemat
+from scipy.ndimage import gaussian_filter
+
+ROWS = 1000
+COLS = 1200
+
+# Fraction of the pixels in missing scans
+NAN_FRACTION = 0.05
+
+# Rows of a missing scan
+SCAN_ROWS = 8
+
+# Bands of the band sensors
+BANDS = {'ibands': 3, 'mbands': 5, 'fc': 3}
+
+# Granule times of the day, VIRS and MODIS
+TIMES = {
+    'VIR': ['0041', '0219', '1041', '1219'],
+    'MOD': ['0050', '0300', '1245', '2025'],
+}
+
+
+def filename(instrument, time, day='2015_336'):
+    """
+        Granule file name, e.g. G_2015_336_0041_RS_N_VIR.mat
+    """
+    return "G_{0}_{1}_RS_N_{2}.mat".format(day, time, instrument)
+
+
+def smooth(rng, shape, sigma=20):
+    """
+        Spatially correlated field between 0 and 1.
+    """
+    field = gaussian_filter(rng.rand(*shape), sigma)
+    field -= field.min()
+    return field / (field.max() or 1)
+
+
+def land_mask(shape):
+    """
+        Land below a wavy coast line, about a quarter of the scene.
+    """
+    rows, cols = shape
+    x = np.arange(cols)
+    coast = rows * (0.75 + 0.05 * np.sin(x * 6 * np.pi / cols))
+    return (np.arange(rows)[:, None] > coast[None, :]).astype(np.float64)
+
+
+def missing_scans(rng, shape, fraction=NAN_FRACTION):
+    """
+        Boolean mask of whole rows of missing scans covering fraction of the
+        scene.
+    """
+    rows = shape[0]
+    scans = rng.permutation(rows // SCAN_ROWS)
+    missing = np.zeros(shape, dtype=bool)
+    for scan in scans[:int(round(fraction * rows / SCAN_ROWS))]:
+        missing[scan * SCAN_ROWS:(scan + 1) * SCAN_ROWS] = True
+    return missing
+
+
+def granule(instrument, shape=(ROWS, COLS), nan_fraction=NAN_FRACTION,
+            seed=0):
+    """
+        Returns the sensors of a synthetic granule.
+
+        :rType: dict() sensor -> ndarray
+    """
+
+    rng = np.random.RandomState(seed)
+    lm = land_mask(shape)
+    missing = missing_scans(rng, shape, nan_fraction)
+
+    sic = np.round(smooth(rng, shape) * 100)
+    sic[missing] = np.nan
+
+    sensors = {
+        'lm': lm,
+        'mw_sic': sic,
+        'mw_npr': smooth(rng, shape) * 0.1,
+        'mw_ngr': smooth(rng, shape) * 0.05,
+    }
+
+    surface = 240 + smooth(rng, shape) * 35
+    surface[missing] = np.nan
+    sensors['sst' if instrument == 'VIR' else 'temp'] = surface
+
+    for sensor, bands in BANDS.iteritems():
+        image = np.empty((bands,) + shape)
+        for band in xrange(bands):
+            image[band] = smooth(rng, shape)
+        image[:, missing] = np.nan
+        sensors[sensor] = image
+
+    return sensors
+
+
+def generate(directory, shape=(ROWS, COLS), nan_fraction=NAN_FRACTION,
+             granules=2):
+    """
+        Write granules synthetic granules of each instrument in directory.
+
+        :rType: list of the file names
+    """
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    files = []
+    seed = 0
+    for instrument, times in sorted(TIMES.iteritems()):
+        for time in times[:granules]:
+            name = filename(instrument, time)
+            savemat(os.path.join(directory, name),
+                    granule(instrument, shape, nan_fraction, seed))
+            files.append(name)
+            seed += 1
+    return files
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Make synthetic granules")
+    parser.add_argument('directory', help="Directory of the granules")
+    parser.add_argument('--rows', type=int, default=ROWS)
+    parser.add_argument('--cols', type=int, default=COLS)
+    parser.add_argument('--nan', type=float, default=NAN_FRACTION,
+                        help="Fraction of NaN pixels")
+    parser.add_argument('--granules', type=int, default=2,
+                        help="Granules per instrument")
+    args = parser.parse_args()
+
+    for name in generate(args.directory, (args.rows, args.cols), args.nan,
+                         args.granules):
+        print "Saved {0}".format(name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pytest
+from scipy.io import savemat
+
+from tools import data, static
+from tools.cache import GRANULE_CACHE
+
+SHAPE = (24, 32)
+
+# VIR and MOD granules of two days
+GRANULES = [
+    'G_2015_336_0041_RS_N_VIR.mat',
+    'G_2015_336_0050_RS_N_MOD.mat',
+    'G_2015_336_1041_RS_N_VIR.mat',
+    'G_2015_337_0219_RS_N_VIR.mat',
+    'G_2015_337_0300_RS_N_MOD.mat',
+]
+
+
+def granule(seed, shape=SHAPE):
+    """
+        Variables of a small granule: a land block in the land mask, integer
+        concentrations with NaN, float bands.
+
+        :rType: dict()
+    """
+    rng = np.random.RandomState(seed)
+    rows, cols = shape
+
+    lm = np.zeros(shape)
+    lm[:, :cols // 4] = 1
+    lm[rows // 2:, cols // 4:cols // 2] = 1
+
+    sic = rng.randint(0, 101, shape).astype(np.float64)
+    sic[rng.rand(*shape) < 0.1] = np.nan
+    sic[0, -1], sic[1, -1] = 0, 100
+
+    return {
+        'lm': lm,
+        'mw_sic': sic,
+        'sst': rng.rand(*shape) * 10 + 265,
+        'ibands': rng.rand(3, rows, cols),
+        'mbands': rng.rand(5, rows, cols),
+        'fc': rng.rand(3, rows, cols),
+    }
+
+
+def write_granule(directory, filename, seed=0, shape=SHAPE):
+    path = os.path.join(str(directory), filename)
+    savemat(path, granule(seed, shape))
+    return path
+
+
+@pytest.fixture
+def data_dir(tmpdir, monkeypatch):
+    """
+        Temporary DATA_DIR with GRANULES, the granule cache and the static
+        products in memory are emptied before and after the test.
+
+        :rType: py.path.local
+    """
+    directory = tmpdir.mkdir('data')
+    for seed, filename in enumerate(GRANULES):
+        write_granule(directory, filename, seed)
+
+    monkeypatch.setattr(data, 'DATA_DIR', str(directory))
+    GRANULE_CACHE.clear()
+    static.clear()
+    yield directory
+    GRANULE_CACHE.clear()
+    static.clear()
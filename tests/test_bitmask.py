@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from tools import stats
+from tools.bitmask import BitMask, popcount, padding_mask
+
+# Sizes around the 8 pixel bytes and the 64 pixel words of popcount
+SIZES = [0, 1, 7, 8, 9, 63, 64, 65, 127, 513, 1001]
+
+
+def random_mask(shape, seed=0, p=0.5):
+    return np.random.RandomState(seed).rand(*shape) < p
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_popcount(size):
+    mask = random_mask((size,), seed=size)
+    bits = np.packbits(mask)
+
+    assert popcount(bits) == np.count_nonzero(mask)
+    assert BitMask.pack(mask).count() == np.count_nonzero(mask)
+
+
+@pytest.mark.parametrize('nbytes', [0, 1, 7, 8, 9, 16, 23])
+def test_popcount_full_bytes(nbytes):
+    bits = np.full(nbytes, 0xFF, dtype=np.uint8)
+    assert popcount(bits) == nbytes * 8
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_pack_unpack(size):
+    mask = random_mask((size,), seed=size)
+    np.testing.assert_array_equal(BitMask.pack(mask).unpack(), mask)
+
+
+@pytest.mark.parametrize('shape', [(3, 5), (7, 9), (8, 8), (11, 13)])
+def test_invert_clears_padding(shape):
+    mask = random_mask(shape)
+    inverted = ~BitMask.pack(mask)
+
+    np.testing.assert_array_equal(inverted.unpack(), ~mask)
+    assert inverted.count() == np.count_nonzero(~mask)
+    # The bits after the last pixel stay 0
+    assert inverted.bits[-1] & ~padding_mask(inverted.size) == 0
+    assert (~BitMask.zeros(shape)).count() == inverted.size
+
+
+@pytest.mark.parametrize('shape', [(3, 5), (8, 8), (11, 13)])
+def test_combine(shape):
+    a, b = random_mask(shape, 1), random_mask(shape, 2)
+    packed_a, packed_b = BitMask.pack(a), BitMask.pack(b)
+
+    np.testing.assert_array_equal((packed_a & packed_b).unpack(), a & b)
+    np.testing.assert_array_equal((packed_a | packed_b).unpack(), a | b)
+    np.testing.assert_array_equal((packed_a ^ packed_b).unpack(), a ^ b)
+
+
+def test_combine_shape_mismatch():
+    with pytest.raises(ValueError):
+        BitMask.zeros((3, 5)) & BitMask.zeros((5, 3))
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('shape', [(1, 1), (7, 9), (40, 33)])
+def test_mask_counts_match_class_counts(seed, shape):
+    ice = random_mask(shape, seed, p=0.4)
+    land = random_mask(shape, seed + 10, p=0.3)
+    nan = random_mask(shape, seed + 20, p=0.1)
+
+    for masks in [dict(ice=ice, land=land, nan=nan), dict(ice=ice, land=land),
+                  dict(ice=ice), dict(land=land), dict(nan=nan)]:
+        packed = dict((name, BitMask.pack(mask))
+                      for name, mask in masks.items())
+        assert stats.mask_counts(**packed) == stats.class_counts(**masks)
+
+
+def test_counts_without_masks():
+    with pytest.raises(ValueError):
+        stats.mask_counts()
+    with pytest.raises(ValueError):
+        stats.class_counts()
@@ -0,0 +1,132 @@
+import os
+import sys
+import subprocess
+
+import numpy as np
+import pytest
+
+from tools import data
+from tools.cache import DEFAULT_MAX_BYTES, GranuleCache
+
+from conftest import GRANULES, granule, write_granule
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+
+@pytest.fixture
+def files(tmpdir):
+    paths = []
+    for index in xrange(4):
+        path = tmpdir.join("granule_{0}.mat".format(index))
+        path.write('')
+        paths.append(str(path))
+    return paths
+
+
+def array(nbytes):
+    return np.zeros(nbytes, dtype=np.uint8)
+
+
+def test_hits_and_misses(files):
+    cache = GranuleCache(max_bytes=1000)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return array(100)
+
+    first = cache.get(files[0], 'lm', loader)
+    assert cache.get(files[0], 'lm', loader) is first
+    assert len(calls) == 1
+    assert not first.flags.writeable
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+    assert stats['nbytes'] == 100
+
+
+def test_evicts_least_recently_used(files):
+    cache = GranuleCache(max_bytes=300)
+    for path in files[:3]:
+        cache.get(path, 'lm', lambda: array(100))
+
+    # files[0] is used again, files[1] becomes the oldest
+    assert cache.lookup(files[0], 'lm') is not None
+    cache.get(files[3], 'lm', lambda: array(100))
+
+    assert cache.nbytes == 300
+    assert cache.stats()['evictions'] == 1
+    assert cache.lookup(files[1], 'lm') is None
+    for path in (files[0], files[2], files[3]):
+        assert cache.lookup(path, 'lm') is not None
+
+
+def test_budget(files):
+    cache = GranuleCache(max_bytes=250)
+    cache.get(files[0], 'lm', lambda: array(100))
+    cache.get(files[0], 'mw_sic', lambda: array(100))
+    cache.get(files[0], 'sst', lambda: array(100))
+
+    assert cache.nbytes == 200
+    assert cache.stats()['entries'] == 2
+
+    # Larger than the whole budget: returned but not kept
+    assert cache.get(files[1], 'lm', lambda: array(300)).nbytes == 300
+    assert cache.lookup(files[1], 'lm') is None
+    assert cache.nbytes == 200
+
+    cache.resize(150)
+    assert cache.nbytes == 100
+    assert cache.lookup(files[0], 'sst') is not None
+
+
+def test_release(files):
+    cache = GranuleCache(max_bytes=1000)
+    for sensor in ('lm', 'mw_sic'):
+        cache.get(files[0], sensor, lambda: array(100))
+    cache.get(files[1], 'lm', lambda: array(100))
+
+    assert cache.release(files[0], 'lm') == 100
+    assert cache.release(files[0]) == 100
+    assert cache.nbytes == 100
+    assert cache.lookup(files[1], 'lm') is not None
+
+
+def test_replaced_file_is_decoded_again(files):
+    cache = GranuleCache(max_bytes=1000)
+    cache.get(files[0], 'lm', lambda: array(100))
+
+    mtime = os.path.getmtime(files[0]) + 10
+    os.utime(files[0], (mtime, mtime))
+
+    assert cache.lookup(files[0], 'lm') is None
+    assert cache.get(files[0], 'lm', lambda: array(50)).nbytes == 50
+
+
+def test_sensor_follows_rewritten_granule(data_dir):
+    path = os.path.join(str(data_dir), GRANULES[0])
+    before = data.sensor(path, 'sst')
+    assert data.sensor(path, 'sst') is before
+
+    write_granule(data_dir, GRANULES[0], seed=99)
+    mtime = os.path.getmtime(path) + 10
+    os.utime(path, (mtime, mtime))
+
+    np.testing.assert_array_equal(data.sensor(path, 'sst'),
+                                  granule(99)['sst'])
+
+
+def max_bytes(environ):
+    script = "from tools.cache import GRANULE_CACHE; " \
+             "print GRANULE_CACHE.max_bytes"
+    path = [os.path.abspath(ROOT), os.environ.get('PYTHONPATH', '')]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(path))
+    env.pop('ROSS_SEA_CACHE_BYTES', None)
+    env.update(environ)
+    return int(subprocess.check_output([sys.executable, '-c', script],
+                                       env=env))
+
+
+def test_environment_budget():
+    assert max_bytes({}) == DEFAULT_MAX_BYTES
+    assert max_bytes({'ROSS_SEA_CACHE_BYTES': '12345'}) == 12345
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from tools import catalog, data
+
+from conftest import GRANULES, write_granule
+
+VIR = [g for g in GRANULES if 'VIR' in g]
+MOD = [g for g in GRANULES if 'MOD' in g]
+
+
+def test_instrument_filter(data_dir):
+    assert catalog.files('vir') == VIR
+    assert catalog.files('MOD') == MOD
+    assert catalog.files('both') == GRANULES
+
+    entry = catalog.granules('vir')[0]
+    assert entry['instrument'] == data.INSTRUMENT[0]
+    assert entry['timestamp'] == data.timestamp(VIR[0])
+
+    with pytest.raises(KeyError):
+        catalog.files('viirs')
+
+
+def test_time_range(data_dir):
+    start = data.date_timestamp('2015_336_0050')
+    end = data.date_timestamp('2015_337_0219')
+
+    # Inclusive on both ends
+    assert catalog.files('both', start, end) == GRANULES[1:4]
+    assert catalog.files('vir', start=start) == VIR[1:]
+    assert catalog.files('mod', end=start) == MOD[:1]
+    assert catalog.files('both', start=end + 1, end=end + 2) == []
+
+
+def test_sensors(data_dir):
+    sensors = catalog.sensors(GRANULES[0])
+
+    assert sorted(sensors) == ['fc', 'ibands', 'lm', 'mbands', 'mw_sic', 'sst']
+    assert sensors['mbands'][0] == (5, 24, 32)
+    assert catalog.sensors('G_2015_336_9999_RS_N_VIR.mat') == {}
+
+
+def test_queries_dont_scan(data_dir, monkeypatch):
+    assert catalog.files() == GRANULES
+
+    def listdir(path):
+        raise AssertionError("queries read the database only")
+
+    monkeypatch.setattr(os, 'listdir', listdir)
+    assert catalog.files('vir') == VIR
+    assert len(catalog.sensors(GRANULES[0])) == 6
+
+
+def test_refresh_new_and_removed(data_dir):
+    assert catalog.files() == GRANULES
+
+    added = 'G_2015_338_0000_RS_N_MOD.mat'
+    write_granule(data_dir, added)
+    os.remove(os.path.join(str(data_dir), GRANULES[0]))
+    assert catalog.files() == GRANULES
+
+    assert catalog.refresh() == 1
+    assert catalog.files() == GRANULES[1:] + [added]
+    assert catalog.sensors(GRANULES[0]) == {}
+    assert catalog.refresh() == 0
+
+
+def test_refresh_rewritten_in_place(data_dir):
+    assert catalog.sensors(GRANULES[0])['lm'][0] == (24, 32)
+
+    path = write_granule(data_dir, GRANULES[0], shape=(12, 16))
+    mtime = os.path.getmtime(path) + 10
+    os.utime(path, (mtime, mtime))
+
+    assert catalog.refresh() == 1
+    assert catalog.sensors(GRANULES[0])['lm'][0] == (12, 16)
+
+
+def test_force(data_dir):
+    catalog.files()
+    assert catalog.refresh() == 0
+    assert catalog.refresh(force=True) == len(GRANULES)
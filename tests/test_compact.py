@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+
+from tools import compact
+from app.models import FcImage, IbandImage, LMImage, MbandImage, SICImage
+
+from conftest import GRANULES, granule
+
+SHAPE = (30, 40)
+
+
+def concentrations(seed=0):
+    rng = np.random.RandomState(seed)
+    image = rng.randint(0, 101, SHAPE).astype(np.float64)
+    image[0, :2] = [0, 100]
+    image[rng.rand(*SHAPE) < 0.1] = np.nan
+    return image
+
+
+def test_mask_round_trip():
+    lm = (np.random.RandomState(0).rand(*SHAPE) < 0.3).astype(np.float64)
+    packed = compact.pack('lm', lm)
+
+    assert packed.dtype == np.bool_
+    np.testing.assert_array_equal(compact.widen(packed), lm)
+    assert compact.widen(packed).dtype == np.float64
+    assert not compact.missing(packed).any()
+
+
+def test_mask_with_other_values_unchanged():
+    lm = np.zeros(SHAPE)
+    lm[0, 0] = np.nan
+    lm[0, 1] = 2
+    assert compact.pack('lm', lm) is lm
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_concentration_round_trip(seed):
+    sic = concentrations(seed)
+    packed = compact.pack('mw_sic', sic)
+
+    assert packed.dtype == np.uint8
+    np.testing.assert_array_equal(compact.widen(packed), sic)
+    np.testing.assert_array_equal(compact.missing(packed), np.isnan(sic))
+    for level in (0, 40, 99, 100):
+        with np.errstate(invalid='ignore'):
+            np.testing.assert_array_equal(compact.above(packed, level),
+                                          sic > level)
+
+
+@pytest.mark.parametrize('value', [0.5, -1, 101])
+def test_concentration_fractions_kept_float(value):
+    sic = concentrations()
+    sic[1, 1] = value
+    packed = compact.pack('mw_sic', sic)
+
+    assert packed.dtype == np.float32
+    np.testing.assert_array_equal(compact.widen(packed), sic)
+
+
+def test_all_nan_concentration():
+    sic = np.empty(SHAPE)
+    sic.fill(np.nan)
+    packed = compact.pack('mw_sic', sic)
+
+    assert packed.dtype == np.uint8
+    assert np.isnan(compact.widen(packed)).all()
+
+
+@pytest.mark.parametrize('sensor', compact.BANDS)
+def test_band_round_trip(sensor):
+    bands = np.random.RandomState(0).rand(3, *SHAPE)
+    bands[0, 0, 0] = np.nan
+    packed = compact.pack(sensor, bands)
+
+    assert packed.dtype == np.float32
+    wide = compact.widen(packed)
+    assert wide.dtype == np.float64
+    np.testing.assert_array_equal(np.isnan(wide), np.isnan(bands))
+    np.testing.assert_allclose(wide, bands, rtol=1e-7)
+
+
+def test_other_sensors_unchanged():
+    sst = np.random.RandomState(0).rand(*SHAPE)
+    assert compact.pack('sst', sst) is sst
+    assert compact.widen(sst) is sst
+    assert compact.pack('lm', None) is None
+
+
+@pytest.mark.parametrize('model', [LMImage, SICImage])
+def test_image_is_float64(data_dir, model):
+    image = model(GRANULES[0]).image()
+    expected = granule(0)[model.SENSOR]
+
+    assert image.dtype == np.float64
+    np.testing.assert_array_equal(image, expected)
+    assert image.flags.writeable
+
+
+def test_image_keeps_nan(data_dir):
+    sic = SICImage(GRANULES[0])
+    image = sic.image()
+
+    assert np.isnan(image).any()
+    np.testing.assert_array_equal(np.isnan(image),
+                                  np.isnan(granule(0)['mw_sic']))
+    assert sic.compact().dtype == np.uint8
+
+
+@pytest.mark.parametrize('model', [IbandImage, MbandImage, FcImage])
+def test_band_images(data_dir, model):
+    image = model(GRANULES[0])
+    assert image.raw().dtype == np.float32
+    np.testing.assert_allclose(image.band(0),
+                               granule(0)[model.SENSOR][0], rtol=1e-7)
+
+
+@pytest.mark.parametrize('model', [LMImage, SICImage, IbandImage])
+def test_nan_percentage(data_dir, model):
+    values = granule(0)[model.SENSOR]
+    expected = 100.0 * np.count_nonzero(np.isnan(values)) / values.size
+
+    assert model(GRANULES[0]).nan_percentage() == pytest.approx(expected)
@@ -0,0 +1,153 @@
+import os
+import imp
+import threading
+import SocketServer
+import SimpleHTTPServer
+
+import pytest
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+data_download = imp.load_source(
+    'data_download', os.path.join(ROOT, 'scripts', 'data_download.py'))
+
+GRANULES = {
+    '2015_336': ['G_2015_336_0041_RS_N_VIR.mat',
+                 'G_2015_336_0050_RS_N_MOD.mat'],
+    '2015_337': ['G_2015_337_0110_RS_N_VIR.mat'],
+}
+
+
+class Handler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+    """
+        SimpleHTTPServer with Range requests, a log of the requests and
+        FAILURES[path] 503 answers before serving path.
+    """
+
+    REQUESTS = []
+    FAILURES = {}
+
+    def do_GET(self):
+        self.REQUESTS.append((self.command, self.path,
+                              self.headers.getheader('Range')))
+        if self.FAILURES.get(self.path):
+            self.FAILURES[self.path] -= 1
+            self.send_error(503)
+            return
+
+        path = self.translate_path(self.path)
+        byte_range = self.headers.getheader('Range')
+        if not byte_range or not os.path.isfile(path):
+            return SimpleHTTPServer.SimpleHTTPRequestHandler.do_GET(self)
+
+        with open(path, 'rb') as f:
+            content = f.read()
+        start = int(byte_range.split('=')[1].split('-')[0])
+        self.send_response(206)
+        self.send_header('Content-Range', "bytes {0}-{1}/{2}".format(
+            start, len(content) - 1, len(content)))
+        self.send_header('Content-Length', str(len(content) - start))
+        self.end_headers()
+        self.wfile.write(content[start:])
+
+    def do_HEAD(self):
+        self.REQUESTS.append((self.command, self.path, None))
+        return SimpleHTTPServer.SimpleHTTPRequestHandler.do_HEAD(self)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmpdir, monkeypatch):
+    """
+        Serve a directory per day with fake granules on localhost.
+
+        :rType: string with the base url
+    """
+    served = tmpdir.mkdir('server')
+    for day, names in GRANULES.items():
+        directory = served.mkdir(day)
+        for name in names:
+            directory.join(name).write_binary(os.urandom(3000))
+        directory.join('README.txt').write('not a granule')
+
+    # SimpleHTTPRequestHandler serves the working directory
+    monkeypatch.chdir(str(served))
+    del Handler.REQUESTS[:]
+    Handler.FAILURES.clear()
+
+    httpd = SocketServer.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield "http://127.0.0.1:{0}/".format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def gets(path):
+    return [r for r in Handler.REQUESTS if r[0] == 'GET' and r[1] == path]
+
+
+def test_days_range():
+    assert data_download.days(['2015_365:2016_001', '2015_336']) == \
+        ['2015_365', '2016_001', '2015_336']
+
+
+def test_listing_and_skip(server, tmpdir, monkeypatch):
+    output = tmpdir.mkdir('out')
+    monkeypatch.setattr('sys.argv', ['data_download.py', '2015_336:2015_337',
+                                     '--url', server, '-o', str(output)])
+    data_download.main()
+
+    names = sorted(n for day in GRANULES.values() for n in day)
+    assert sorted(os.listdir(str(output))) == names
+    for day, day_names in GRANULES.items():
+        for name in day_names:
+            assert output.join(name).read_binary() == \
+                tmpdir.join('server', day, name).read_binary()
+
+    # Files with the size of the server aren't downloaded again
+    del Handler.REQUESTS[:]
+    data_download.main()
+    assert not [r for r in Handler.REQUESTS
+                if r[0] == 'GET' and r[1].endswith('.mat')]
+
+
+def test_resume_from_part(server, tmpdir):
+    name = GRANULES['2015_336'][0]
+    content = tmpdir.join('server', '2015_336', name).read_binary()
+    path = str(tmpdir.join(name))
+    with open(path + '.part', 'wb') as f:
+        f.write(content[:1000])
+
+    url = "{0}2015_336/{1}".format(server, name)
+    assert data_download.download(url, path, backoff=0) == 'downloaded'
+
+    assert gets('/2015_336/' + name)[-1][2] == 'bytes=1000-'
+    assert open(path, 'rb').read() == content
+    assert not os.path.exists(path + '.part')
+
+
+def test_retry_after_failure(server, tmpdir):
+    name = GRANULES['2015_337'][0]
+    Handler.FAILURES['/2015_337/' + name] = 2
+
+    path = str(tmpdir.join(name))
+    url = "{0}2015_337/{1}".format(server, name)
+    assert data_download.download(url, path, retries=3,
+                                  backoff=0) == 'downloaded'
+    assert len(gets('/2015_337/' + name)) == 3
+    assert open(path, 'rb').read() == \
+        tmpdir.join('server', '2015_337', name).read_binary()
+
+
+def test_missing_file_not_retried(server, tmpdir):
+    url = "{0}2015_337/G_2015_337_9999_RS_N_VIR.mat".format(server)
+    with pytest.raises(requests.HTTPError):
+        data_download.download(url, str(tmpdir.join('missing.mat')),
+                               retries=3, backoff=0)
+    # The HEAD request for the size fails once and nothing else is asked
+    assert [r[:2] for r in Handler.REQUESTS] == \
+        [('HEAD', '/2015_337/G_2015_337_9999_RS_N_VIR.mat')]
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from tools import compact, stats
+from app.models import SICImage
+
+from conftest import GRANULES
+
+SHAPE = (40, 50)
+LEVELS = (0, 1, 15, 40, 85, 99, 100)
+
+
+def concentrations(seed, fractions=False):
+    """
+        Sea ice concentrations 0 - 100 with NaN, fractional when fractions.
+
+        :rType: ndarray float64
+    """
+    rng = np.random.RandomState(seed)
+    if fractions:
+        image = rng.rand(*SHAPE) * 100
+        # Just above and below the levels
+        image.flat[:len(LEVELS)] = np.array(LEVELS) + 1e-9
+        image.flat[len(LEVELS):2 * len(LEVELS)] = np.array(LEVELS) - 1e-9
+    else:
+        image = rng.randint(0, 101, SHAPE).astype(np.float64)
+    image.flat[-4:] = [0, 100, 0, 100]
+    image[rng.rand(*SHAPE) < 0.1] = np.nan
+    return image
+
+
+def expected_extent(image, levels=LEVELS):
+    with np.errstate(invalid='ignore'):
+        return dict((level, stats.percentage(np.count_nonzero(image > level),
+                                             image.size))
+                    for level in levels)
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('fractions', [False, True])
+def test_ceil_binning(seed, fractions):
+    image = concentrations(seed, fractions)
+    histogram = stats.concentration_histogram(image)
+
+    assert histogram.sum() == np.count_nonzero(~np.isnan(image))
+    assert stats.exceedance(histogram, image.size, LEVELS) == \
+        expected_extent(image)
+
+
+def test_out_of_range_values():
+    image = np.array([-5.0, -0.5, 0.0, 100.0, 100.5, 250.0, np.nan])
+    histogram = stats.concentration_histogram(image)
+
+    assert histogram[0] == 3
+    assert histogram[100] == 1
+    assert histogram[stats.CONCENTRATION_BINS - 1] == 2
+    assert stats.exceedance(histogram, image.size, [0, 100]) == \
+        expected_extent(image, [0, 100])
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_compact_matches_float(seed):
+    image = concentrations(seed)
+    packed = compact.pack('mw_sic', image)
+    assert packed.dtype == np.uint8
+
+    np.testing.assert_array_equal(stats.concentration_histogram(packed),
+                                  stats.concentration_histogram(image))
+    assert stats.exceedance(stats.concentration_histogram(packed),
+                            packed.size, LEVELS) == expected_extent(image)
+
+
+@pytest.mark.parametrize('levels', [[-1], [101], [15, 150], [40.5]])
+def test_bad_levels(levels):
+    histogram = stats.concentration_histogram(concentrations(0))
+    with pytest.raises(ValueError):
+        stats.exceedance(histogram, histogram.sum(), levels)
+
+
+def test_sic_extent(data_dir):
+    sic = SICImage(GRANULES[0])
+    image = sic.image()
+
+    extent = sic.extent(LEVELS)
+    assert extent == expected_extent(image)
+    assert extent[40] == sic.percentage()['ice']
+    assert sorted(sic.extent()) == list(SICImage.EXTENT_LEVELS)
+
+    with pytest.raises(ValueError):
+        sic.extent([0, 101])
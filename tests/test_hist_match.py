@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from app.reports import analysis
+from app.reports.analysis import ECDF, hist_match
+
+SHAPE = (60, 80)
+
+
+def integer_image(rng, dtype, low, high, nan_fraction=0.0):
+    image = rng.randint(low, high, SHAPE).astype(dtype)
+    if nan_fraction:
+        image = image.astype(np.float64)
+        image[rng.rand(*SHAPE) < nan_fraction] = np.nan
+    return image
+
+
+def sorted_match(source, template, monkeypatch, **kwargs):
+    """
+        hist_match through the np.unique path, no span fits the lookup table
+    """
+    with monkeypatch.context() as patch:
+        patch.setattr(analysis, 'MAX_LUT_SPAN', 0)
+        return hist_match(source, template, **kwargs)
+
+
+@pytest.mark.parametrize('dtype, low, high, nan_fraction', [
+    (np.uint8, 0, 256, 0.0),
+    (np.uint8, 0, 101, 0.0),
+    (np.int16, -3000, 3000, 0.0),
+    (np.int16, -20, 20, 0.0),
+    (np.uint8, 0, 101, 0.1),
+    (np.int16, -3000, 3000, 0.3),
+])
+def test_lut_matches_sorting(dtype, low, high, nan_fraction, monkeypatch):
+    rng = np.random.RandomState(0)
+    source = integer_image(rng, dtype, low, high, nan_fraction)
+    template = integer_image(rng, dtype, low, high, nan_fraction)
+    assert analysis._integer_domain(source[np.isfinite(source)]) is not None
+
+    expected = sorted_match(source, template, monkeypatch)
+    np.testing.assert_array_equal(hist_match(source, template), expected)
+    np.testing.assert_array_equal(hist_match(source, ECDF(template)),
+                                  expected)
+
+
+def test_float_values_use_sorting():
+    source = np.random.RandomState(1).rand(*SHAPE)
+    assert analysis._integer_domain(source) is None
+
+
+@pytest.mark.parametrize('lut', [True, False])
+def test_nan_pass_through_and_count(lut, monkeypatch):
+    rng = np.random.RandomState(2)
+    source = integer_image(rng, np.uint8, 0, 101, nan_fraction=0.2)
+    template = integer_image(rng, np.uint8, 0, 101, nan_fraction=0.1)
+
+    if lut:
+        matched, count = hist_match(source, template, full_output=True)
+    else:
+        matched, count = sorted_match(source, template, monkeypatch,
+                                      full_output=True)
+
+    assert matched.shape == source.shape
+    np.testing.assert_array_equal(np.isnan(matched), np.isnan(source))
+    assert count == np.count_nonzero(np.isfinite(source))
+
+    # Matched values come from the finite template values
+    finite = template[np.isfinite(template)]
+    assert finite.min() <= np.nanmin(matched) <= np.nanmax(matched) <= \
+        finite.max()
+
+
+def test_all_nan_source():
+    source = np.empty(SHAPE)
+    source.fill(np.nan)
+    template = integer_image(np.random.RandomState(3), np.uint8, 0, 101)
+
+    matched, count = hist_match(source, template, full_output=True)
+    assert count == 0
+    assert np.isnan(matched).all()
+
+
+def test_ecdf_leaves_nan_out():
+    image = np.array([1.0, np.nan, 2.0, 2.0, np.nan])
+    cdf = ECDF(image)
+
+    assert cdf.count == 3
+    np.testing.assert_array_equal(cdf.values, [1.0, 2.0])
+    np.testing.assert_allclose(cdf.quantiles, [1 / 3.0, 1.0])
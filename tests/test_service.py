@@ -0,0 +1,86 @@
+import os
+import json
+import threading
+
+import pytest
+import requests
+
+from tools import data
+from app import service
+
+from conftest import GRANULES, write_granule
+from test_static import concurrently
+
+LARGE = (600, 800)
+
+
+@pytest.fixture
+def server(data_dir, monkeypatch):
+    """
+        The service on a free localhost port over the temporary data
+        directory.
+
+        :rType: string with the base url
+    """
+    # A granule large enough for the static products to take a while
+    write_granule(data_dir, GRANULES[0], shape=LARGE)
+
+    monkeypatch.setattr(service, 'CATALOG', service.Catalog())
+    # Decoded granules, but no static products yet: requests reach them
+    # together
+    for filename in GRANULES:
+        data.sensors(os.path.join(str(data_dir), filename), ['lm', 'mw_sic'])
+    monkeypatch.setattr(service.Handler, 'log_message',
+                        lambda self, *args: None)
+
+    httpd = service.Server(('127.0.0.1', 0), service.Handler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield "http://127.0.0.1:{0}/".format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get(url):
+    response = requests.get(url)
+    return response.status_code, response.json()
+
+
+@pytest.mark.parametrize('endpoint', ['overlap', 'lm'])
+def test_concurrent_cold_requests(server, endpoint):
+    url = "{0}{1}/{2}".format(server, endpoint, GRANULES[0])
+
+    results, errors = concurrently(lambda: get(url))
+
+    assert not errors
+    statuses = [status for status, _ in results]
+    assert statuses == [200] * len(results)
+    bodies = set(json.dumps(body, sort_keys=True) for _, body in results)
+    assert len(bodies) == 1
+
+
+def test_concurrent_granules(server):
+    urls = ["{0}{1}/{2}".format(server, endpoint, filename)
+            for endpoint in ('overlap', 'lm', 'sic') for filename in GRANULES]
+    urls = iter(urls * 2)
+    lock = threading.Lock()
+
+    def next_get():
+        with lock:
+            url = next(urls)
+        return get(url)
+
+    results, errors = concurrently(next_get, threads=len(GRANULES) * 6)
+    assert not errors
+    assert [status for status, _ in results] == [200] * len(results)
+
+
+def test_errors(server):
+    assert get(server + "lm/G_2015_336_9999_RS_N_VIR.mat")[0] == 404
+    assert get(server + "sic/{0}?levels=150".format(GRANULES[0]))[0] == 400
+    assert get(server + "nope")[0] == 404
+
+    status, body = get(server + "metrics")
+    assert status == 200
+    assert body['granules'] == len(GRANULES)
@@ -0,0 +1,79 @@
+import os
+import threading
+
+import numpy as np
+
+from tools import static
+from app.models import LMImage
+
+from conftest import GRANULES
+
+THREADS = 20
+
+
+def concurrently(func, threads=THREADS):
+    """
+        Call func from threads threads released at the same time.
+
+        :rType: tuple (results, errors)
+    """
+    barrier = threading.Event()
+    results, errors = [], []
+
+    def run():
+        barrier.wait()
+        try:
+            results.append(func())
+        except Exception, e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=run) for _ in xrange(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.set()
+    for worker in workers:
+        worker.join()
+    return results, errors
+
+
+def test_derived_computes_once(data_dir):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return np.arange(1000)
+
+    results, errors = concurrently(
+        lambda: static.derived('key', 'product', compute))
+
+    assert not errors
+    assert len(calls) == 1
+    for result in results:
+        np.testing.assert_array_equal(result, np.arange(1000))
+        assert not result.flags.writeable
+
+    # Saved once, without temporary files left behind
+    directory = os.path.dirname(static.product_path('key', 'product'))
+    assert os.listdir(directory) == ['product.npy']
+
+
+def test_derived_loads_from_disk(data_dir):
+    static.derived('key', 'count', lambda: 42)
+    static.clear()
+
+    def compute():
+        raise AssertionError("the product is on disk")
+
+    assert static.derived('key', 'count', compute) == 42
+
+
+def test_border_mask_threads(data_dir):
+    lm = LMImage(GRANULES[0])
+    expected = LMImage(GRANULES[1])
+
+    results, errors = concurrently(lambda: lm.border_mask().count())
+    assert not errors
+    assert len(set(results)) == 1
+
+    static.clear()
+    assert results[0] == expected.border_mask().count() > 0
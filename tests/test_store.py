@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+from scipy.io import loadmat
+
+from tools import compact, data, ingest, store
+from tools.cache import GRANULE_CACHE
+from app.models import IbandImage, LMImage, SICImage
+
+from conftest import GRANULES, granule
+
+SENSORS = ['fc', 'ibands', 'lm', 'mbands', 'mw_sic', 'sst']
+
+
+def path(data_dir, filename=GRANULES[0]):
+    return os.path.join(str(data_dir), filename)
+
+
+def test_convert(data_dir):
+    filepath = path(data_dir)
+    assert ingest.convert(filepath) == SENSORS
+
+    mat = loadmat(filepath)
+    for sensor in SENSORS:
+        assert store.is_fresh(filepath, sensor)
+        stored = store.open_sensor(filepath, sensor)
+        assert isinstance(stored, np.memmap)
+        assert not stored.flags.writeable
+
+        packed = compact.pack(sensor, mat[sensor])
+        assert stored.dtype == packed.dtype
+        np.testing.assert_array_equal(stored, packed)
+        np.testing.assert_array_equal(compact.widen(np.asarray(stored)),
+                                      compact.widen(packed))
+
+    # Nothing left under a temporary name
+    directory = store.granule_dir(filepath)
+    assert sorted(os.listdir(directory)) == \
+        sorted("{0}.npy".format(sensor) for sensor in SENSORS)
+
+
+def test_convert_skips_fresh(data_dir):
+    filepath = path(data_dir)
+    ingest.convert(filepath)
+    calls = data.io_stats()['calls']
+
+    assert ingest.convert(filepath) == []
+    assert data.io_stats()['calls'] == calls
+    assert ingest.convert(filepath, force=True) == SENSORS
+
+    os.remove(store.sensor_path(filepath, 'mw_sic'))
+    assert ingest.convert(filepath) == ['mw_sic']
+
+
+def test_stale_conversion(data_dir):
+    filepath = path(data_dir)
+    ingest.convert(filepath)
+
+    mtime = os.path.getmtime(store.sensor_path(filepath, 'lm')) + 10
+    os.utime(filepath, (mtime, mtime))
+
+    assert not store.is_fresh(filepath, 'lm')
+    assert store.open_sensor(filepath, 'lm') is None
+    assert ingest.convert(filepath) == SENSORS
+
+
+def test_models_read_the_store(data_dir):
+    filepath = path(data_dir)
+    expected = dict((model, model(GRANULES[0]).image())
+                    for model in (LMImage, SICImage))
+    bands = IbandImage(GRANULES[0]).band(1)
+
+    ingest.convert(filepath)
+    GRANULE_CACHE.clear()
+    calls = data.io_stats()['calls']
+
+    for model, image in expected.items():
+        np.testing.assert_array_equal(model(GRANULES[0]).image(), image)
+    np.testing.assert_array_equal(IbandImage(GRANULES[0]).band(1), bands)
+    assert isinstance(data.sensor(filepath, 'mw_sic'), np.memmap)
+
+    # Windows are read from the memory map
+    roi = ((2, 10), (3, 7))
+    np.testing.assert_array_equal(
+        SICImage(GRANULES[0]).image(roi), expected[SICImage][2:10, 3:7])
+    assert data.io_stats()['calls'] == calls
+
+
+def test_store_values_match_loadmat(data_dir):
+    for filename in GRANULES:
+        ingest.convert(path(data_dir, filename))
+    GRANULE_CACHE.clear()
+
+    for seed, filename in enumerate(GRANULES):
+        values = granule(seed)
+        stored = data.sensors(path(data_dir, filename), SENSORS)
+        for sensor in SENSORS:
+            np.testing.assert_allclose(compact.widen(np.asarray(
+                stored[sensor])), values[sensor], rtol=1e-7)
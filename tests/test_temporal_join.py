@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+from tools import data
+
+
+def name(day, hour, minute, instrument='VIR'):
+    return "G_2015_{0:03d}_{1:02d}{2:02d}_RS_N_{3}.mat".format(
+        day, hour, minute, instrument)
+
+
+def random_names(rng, count, instrument):
+    minutes = rng.sample(xrange(3 * 24 * 60), count)
+    return [name(336 + m // 1440, m % 1440 // 60, m % 60, instrument)
+            for m in minutes]
+
+
+def nested_loop(left, right, interval, nearest=False):
+    """
+        The O(n * m) pairing temporal_join replaces: left granules in
+        acquisition order, each compared with every right granule.
+    """
+    def minutes(a, b):
+        return abs(data.timestamp(a) - data.timestamp(b)) / 60
+
+    pairs = []
+    for vir in sorted(left, key=data.timestamp):
+        candidates = [mod for mod in sorted(right, key=data.timestamp)
+                      if minutes(vir, mod) <= interval]
+        if nearest and candidates:
+            # Ties go to the earlier granule
+            candidates = [min(candidates, key=lambda mod: minutes(vir, mod))]
+        pairs.extend((vir, mod) for mod in candidates)
+    return pairs
+
+
+def join(*args, **kwargs):
+    return list(data.temporal_join(*args, **kwargs))
+
+
+@pytest.mark.parametrize('nearest', [False, True])
+def test_empty_side(nearest):
+    names = [name(336, 0, 41)]
+    assert join([], names, 20, nearest=nearest) == []
+    assert join(names, [], 20, nearest=nearest) == []
+    assert join([], [], 20, nearest=nearest) == []
+
+
+def test_interval_bounds():
+    vir = name(336, 12, 0)
+    mods = [name(336, 11, 39, 'MOD'), name(336, 11, 40, 'MOD'),
+            name(336, 12, 20, 'MOD'), name(336, 12, 21, 'MOD')]
+
+    assert join([vir], mods, 20) == [(vir, mods[1]), (vir, mods[2])]
+    assert join([vir], mods[:1] + mods[2:], 20, nearest=True) == \
+        [(vir, mods[2])]
+    assert join([vir], [mods[0], mods[3]], 20, nearest=True) == []
+
+
+def test_nearest_tie_goes_before():
+    vir = name(336, 12, 0)
+    before, after = name(336, 11, 50, 'MOD'), name(336, 12, 10, 'MOD')
+
+    assert join([vir], [after, before], 20, nearest=True) == [(vir, before)]
+    assert join([vir], [before, after], 20, nearest=True) == [(vir, before)]
+
+
+def test_nearest_exact_match():
+    vir = name(336, 12, 0)
+    mods = [name(336, 11, 59, 'MOD'), name(336, 12, 0, 'MOD'),
+            name(336, 12, 1, 'MOD')]
+    assert join([vir], mods, 20, nearest=True) == [(vir, mods[1])]
+
+
+def test_unsorted_inputs():
+    virs = [name(337, 3, 0), name(336, 1, 0), name(336, 23, 50)]
+    mods = [name(337, 0, 5, 'MOD'), name(336, 1, 10, 'MOD'),
+            name(337, 2, 55, 'MOD'), name(336, 0, 55, 'MOD')]
+
+    assert join(virs, mods, 15) == [
+        (virs[1], mods[3]), (virs[1], mods[1]),
+        (virs[2], mods[0]),
+        (virs[0], mods[2]),
+    ]
+    assert join(virs, mods, 15, nearest=True) == [
+        (virs[1], mods[3]), (virs[2], mods[0]), (virs[0], mods[2])]
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('nearest', [False, True])
+def test_matches_nested_loop(seed, nearest):
+    rng = random.Random(seed)
+    virs = random_names(rng, rng.randint(1, 60), 'VIR')
+    mods = random_names(rng, rng.randint(1, 60), 'MOD')
+    interval = rng.choice([5, 20, 90])
+
+    assert join(virs, mods, interval, nearest=nearest) == \
+        nested_loop(virs, mods, interval, nearest=nearest)
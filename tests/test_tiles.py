@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from scipy.ndimage import filters, sobel
+
+from tools import tiles
+
+WIDTH = 37
+
+
+def untiled(image):
+    return filters.generic_laplace(image, sobel,
+                                   output=tiles.edge_dtype(image.dtype))
+
+
+def random_image(rows, dtype, seed=0):
+    rng = np.random.RandomState(seed)
+    if dtype == np.bool_:
+        return rng.rand(rows, WIDTH) < 0.3
+    if dtype == np.uint8:
+        return rng.randint(0, 256, (rows, WIDTH)).astype(np.uint8)
+    return rng.randn(rows, WIDTH).astype(dtype)
+
+
+@pytest.mark.parametrize('dtype', [np.bool_, np.uint8, np.float64])
+@pytest.mark.parametrize('rows, tile_rows', [
+    (50, 16),   # last tile shorter than the others
+    (49, 16),
+    (33, 32),   # last tile of a single row
+    (64, 16),   # multiple of tile_rows
+    (10, 16),   # fewer rows than a tile
+    (16, 16),
+])
+@pytest.mark.parametrize('workers', [1, 4])
+def test_matches_untiled(dtype, rows, tile_rows, workers):
+    image = random_image(rows, dtype)
+    expected = untiled(image)
+
+    output = tiles.laplace_sobel(image, tile_rows=tile_rows, workers=workers)
+
+    assert output.dtype == expected.dtype
+    np.testing.assert_array_equal(output, expected)
+
+
+def test_bool_edges_are_int8():
+    image = random_image(50, np.bool_)
+    output = tiles.laplace_sobel(image, tile_rows=16, workers=2)
+
+    assert output.dtype == np.int8
+    # Same values as filtering the mask as float64
+    np.testing.assert_array_equal(
+        output, filters.generic_laplace(image.astype(np.float64), sobel))
+
+
+def test_edge_dtype():
+    assert tiles.edge_dtype(np.bool_) == np.int8
+    assert tiles.edge_dtype(np.uint8) == np.int16
+    assert tiles.edge_dtype(np.int8) == np.int16
+    assert tiles.edge_dtype(np.float32) == np.float32
@@ -0,0 +1,136 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Default byte budget for decoded sensor arrays held by the process, can be
+# overwritten with the ROSS_SEA_CACHE_BYTES environment variable.
+DEFAULT_MAX_BYTES = 1024 ** 3
+
+
+class GranuleCache(object):
+    """
+        Process-wide LRU cache of decoded sensor arrays. Entries are keyed by
+        (filepath, mtime, sensor) so a granule that is rewritten on disk is
+        decoded again instead of being served stale.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def key(filepath, sensor):
+        filepath = os.path.abspath(filepath)
+        return (filepath, os.path.getmtime(filepath), sensor)
+
+    def get(self, filepath, sensor, loader):
+        """
+            Returns the cached array for sensor in filepath, calling loader()
+            to decode it on a miss.
+
+            :params:
+                :param filepath: string with the path of the .mat file
+                :param sensor: string with the sensor name, e.g. mw_sic, lm
+                :param loader: callable with no arguments that returns the
+                               decoded ndarray (or None if it's missing)
+
+            :rType: ndarray
+        """
+        value = self.lookup(filepath, sensor)
+        if value is None:
+            value = loader()
+            self.put(self.key(filepath, sensor), value)
+        return value
+
+    def lookup(self, filepath, sensor):
+        """
+            Returns the cached array for sensor in filepath or None on a miss.
+
+            :rType: ndarray or None
+        """
+        key = self.key(filepath, sensor)
+
+        with self._lock:
+            if key in self._entries:
+                value = self._entries.pop(key)
+                self._entries[key] = value
+                self.hits += 1
+                return value
+            self.misses += 1
+
+    def put(self, key, value):
+        """
+            Store value under key, evicting the least recently used entries
+            until the cache is back under its byte budget. Arrays larger than
+            the whole budget are returned to the caller but never stored.
+        """
+        nbytes = getattr(value, 'nbytes', None)
+        if nbytes is None or nbytes > self.max_bytes:
+            return
+
+        # Cached arrays are shared between every model pointing to the same
+        # granule, nobody gets to modify them in place.
+        value.flags.writeable = False
+
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key).nbytes
+            self._entries[key] = value
+            self.nbytes += nbytes
+            self._evict()
+
+    def release(self, filepath, sensor=None):
+        """
+            Drop every entry of filepath (all sensors when sensor is None).
+
+            :rType: int, number of bytes released
+        """
+        filepath = os.path.abspath(filepath)
+        released = 0
+
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == filepath and sensor in (None, key[2]):
+                    released += self._entries.pop(key).nbytes
+            self.nbytes -= released
+
+        return released
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """
+            rType: dict()
+        """
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'nbytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self._entries:
+            _, value = self._entries.popitem(last=False)
+            self.nbytes -= value.nbytes
+            self.evictions += 1
+
+
+GRANULE_CACHE = GranuleCache(
+    int(os.environ.get('ROSS_SEA_CACHE_BYTES', DEFAULT_MAX_BYTES)))
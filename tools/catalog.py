@@ -0,0 +1,233 @@
+# ============================================================================
+#
+#   Granule catalog: an SQLite database of the .mat files in the data
+#   directory with their instrument, acquisition time, sensors (shape and
+#   type), size and mtime. The data directory is scanned the first time a
+#   process queries the catalog, only granules that are new or changed on
+#   disk are inspected again. Later queries only read the database, a long
+#   running process calls refresh() to see the files changed since:
+#
+#       catalog.files('vir', start=data.date_timestamp('2015_336_0600'))
+#       catalog.refresh()
+#
+# ============================================================================
+
+import os
+import sqlite3
+import threading
+
+from scipy.io import whosmat
+
+from tools import data, store
+
+CATALOG_NAME = 'catalog.sqlite'
+
+# Data directories whose catalog this process has refreshed
+_REFRESHED = set()
+_LOCK = threading.RLock()
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS granules (
+        filename TEXT PRIMARY KEY,
+        instrument TEXT,
+        timestamp REAL,
+        size INTEGER,
+        mtime REAL
+    );
+    CREATE INDEX IF NOT EXISTS granules_time
+        ON granules (instrument, timestamp);
+    CREATE TABLE IF NOT EXISTS sensors (
+        filename TEXT,
+        sensor TEXT,
+        shape TEXT,
+        dtype TEXT,
+        PRIMARY KEY (filename, sensor)
+    );
+"""
+
+
+def catalog_path():
+    """
+        The catalog lives in the store directory of the data directory.
+
+        :rtype: string
+    """
+    return os.path.join(data.DATA_DIR, store.STORE_DIRNAME, CATALOG_NAME)
+
+
+def connect():
+    path = catalog_path()
+    directory = os.path.dirname(path)
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    connection = sqlite3.connect(path, timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.text_factory = str
+    return connection
+
+
+def refresh(force=False):
+    """
+        Bring the catalog up to date with the data directory. Every granule
+        is stat'ed, which is cheap, and only the ones that are new or whose
+        size or mtime changed have their sensors read again (with whosmat,
+        which only reads the variable headers). The mtime of the data
+        directory isn't enough: rewriting a granule in place doesn't change
+        it.
+
+        :params:
+            :param force: read the sensors of every granule again even if
+                          it didn't change.
+
+        :rType: int, number of granules added or updated
+    """
+
+    connection = connect()
+
+    try:
+        connection.executescript(SCHEMA)
+        known = dict(
+            (r['filename'], (r['size'], r['mtime']))
+            for r in connection.execute(
+                "SELECT filename, size, mtime FROM granules"))
+
+        found = set()
+        updated = 0
+
+        for filename in os.listdir(data.DATA_DIR):
+            if not filename.endswith('.mat'):
+                continue
+
+            filepath = os.path.join(data.DATA_DIR, filename)
+            stat = os.stat(filepath)
+            found.add(filename)
+
+            unchanged = known.get(filename) == (stat.st_size, stat.st_mtime)
+            if unchanged and not force:
+                continue
+
+            try:
+                acquired = data.timestamp(filename)
+                variables = whosmat(filepath)
+            except Exception, ex:
+                print "catalog: skipping {0}, {1}".format(filename, ex)
+                found.discard(filename)
+                continue
+
+            connection.execute(
+                "INSERT OR REPLACE INTO granules VALUES (?, ?, ?, ?, ?)",
+                (filename, instrument_code(filename), acquired,
+                 stat.st_size, stat.st_mtime))
+            connection.execute(
+                "DELETE FROM sensors WHERE filename = ?", (filename,))
+            connection.executemany(
+                "INSERT INTO sensors VALUES (?, ?, ?, ?)",
+                [(filename, name, 'x'.join(str(n) for n in shape), dtype)
+                 for name, shape, dtype in variables])
+            updated += 1
+
+        for filename in set(known) - found:
+            connection.execute(
+                "DELETE FROM granules WHERE filename = ?", (filename,))
+            connection.execute(
+                "DELETE FROM sensors WHERE filename = ?", (filename,))
+
+        connection.commit()
+    finally:
+        connection.close()
+
+    with _LOCK:
+        _REFRESHED.add(data.DATA_DIR)
+    return updated
+
+
+def ensure_refreshed():
+    """
+        Refresh the catalog if this process hasn't done it yet for the data
+        directory. Called by the queries, the directory is scanned once.
+    """
+    with _LOCK:
+        if data.DATA_DIR not in _REFRESHED:
+            refresh()
+
+
+def instrument_code(filename):
+    """
+        Returns the instrument code of a granule, VIR or MOD (see
+        data.INSTRUMENT), None if the name doesn't tell.
+    """
+    for code in (data.INSTRUMENT[0], data.INSTRUMENT[1]):
+        if code in filename:
+            return code
+    return None
+
+
+def granules(instrument='both', start=None, end=None):
+    """
+        Returns the catalog entries of an instrument acquired between start and
+        end, sorted by acquisition time.
+
+        :params:
+            :param instrument: string vir, mod or both, see data.INSTRUMENT_MAP
+            :param start: seconds since the epoch (UTC), see
+                          data.date_timestamp. None doesn't limit.
+            :param end: seconds since the epoch (UTC), inclusive. None doesn't
+                        limit.
+
+        :rType: list of dict() with filename, instrument, timestamp, size and
+                mtime.
+    """
+
+    ensure_refreshed()
+
+    query = "SELECT * FROM granules WHERE 1"
+    params = list()
+
+    code = data.INSTRUMENT[data.INSTRUMENT_MAP[instrument.lower()]]
+    if code != data.INSTRUMENT[2]:
+        query += " AND instrument = ?"
+        params.append(code)
+    if start is not None:
+        query += " AND timestamp >= ?"
+        params.append(start)
+    if end is not None:
+        query += " AND timestamp <= ?"
+        params.append(end)
+    query += " ORDER BY timestamp, filename"
+
+    connection = connect()
+    try:
+        return [dict(r) for r in connection.execute(query, params)]
+    finally:
+        connection.close()
+
+
+def files(instrument='both', start=None, end=None):
+    """
+        Same as granules but returns only the file names.
+
+        :rType: list
+    """
+    return [g['filename'] for g in granules(instrument, start, end)]
+
+
+def sensors(filename):
+    """
+        Returns the sensors of a granule with their shape and type.
+
+        :rType: dict(), sensor -> (shape tuple, dtype string)
+    """
+
+    ensure_refreshed()
+
+    connection = connect()
+    try:
+        return dict(
+            (r['sensor'],
+             (tuple(int(n) for n in r['shape'].split('x') if n), r['dtype']))
+            for r in connection.execute(
+                "SELECT * FROM sensors WHERE filename = ?", (filename,)))
+    finally:
+        connection.close()
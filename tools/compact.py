@@ -0,0 +1,126 @@
+# ============================================================================
+#
+#   Compact in-memory types of the decoded sensors. loadmat gives float64 for
+#   everything, the granule cache keeps instead:
+#
+#       lm                  bool (when it's a 0/1 mask)
+#       mw_sic              uint8, MISSING where it was NaN (when every value
+#                           is an integer concentration 0 - 100), float32
+#                           otherwise
+#       ibands, mbands, fc  float32
+#
+#   Other sensors are kept as decoded. widen() gives back the float64 array
+#   with NaN, missing() the mask of the NaN pixels of any representation:
+#
+#       image = compact.pack('mw_sic', mat['mw_sic'])
+#       compact.widen(image)
+#
+# ============================================================================
+
+import numpy as np
+
+# mw_sic value of the NaN pixels in uint8
+MISSING = 255
+
+# Highest sea ice concentration
+MAX_CONCENTRATION = 100
+
+BANDS = ('ibands', 'mbands', 'fc')
+
+
+def pack(sensor, image):
+    """
+        Returns the compact representation of a decoded sensor. Memory maps
+        from the store are returned as they are, they aren't in memory (see
+        tools.ingest, which stores the compact types).
+
+        :params:
+            :param sensor: string with the sensor name, e.g. mw_sic
+            :param image: ndarray as decoded by loadmat, or None
+
+        :rType: ndarray
+    """
+    if (not isinstance(image, np.ndarray) or isinstance(image, np.memmap) or
+            image.dtype != np.float64):
+        return image
+
+    if sensor == 'lm':
+        return pack_mask(image)
+    if sensor == 'mw_sic':
+        return pack_concentration(image)
+    if sensor in BANDS:
+        return image.astype(np.float32)
+    return image
+
+
+def pack_mask(image):
+    """
+        0/1 float mask as bool, anything else (NaN, other values) unchanged.
+
+        :rType: ndarray
+    """
+    land = image == 1
+    if np.count_nonzero(land) + np.count_nonzero(image == 0) != image.size:
+        return image
+    return land
+
+
+def pack_concentration(image):
+    """
+        Sea ice concentrations as uint8 with NaN as MISSING. Values that
+        don't fit (fractions, out of 0 - 100) are kept as float32 instead.
+
+        :rType: ndarray
+    """
+    nan = np.isnan(image)
+    valid = image[~nan]
+    if (valid.size and (valid.min() < 0 or valid.max() > MAX_CONCENTRATION or
+                        np.any(valid != np.round(valid)))):
+        return image.astype(np.float32)
+
+    out = np.empty(image.shape, dtype=np.uint8)
+    np.copyto(out, image, casting='unsafe', where=~nan)
+    out[nan] = MISSING
+    return out
+
+
+def missing(image):
+    """
+        Boolean mask of the NaN pixels of a compact (or float) image.
+
+        :rType: ndarray
+    """
+    if image.dtype == np.bool_:
+        return np.zeros(image.shape, dtype=bool)
+    if image.dtype == np.uint8:
+        return image == MISSING
+    return np.isnan(image)
+
+
+def above(image, level):
+    """
+        Boolean mask of the pixels greater than level, NaN pixels are never
+        above like with floats.
+
+        :rType: ndarray
+    """
+    out = image > level
+    if image.dtype == np.uint8:
+        out &= image != MISSING
+    return out
+
+
+def widen(image):
+    """
+        Returns a compact image as float64 with NaN for the missing pixels.
+        float64 images are returned as they are.
+
+        :rType: ndarray
+    """
+    if image is None or image.dtype == np.float64:
+        return image
+
+    out = image.astype(np.float64)
+    if image.dtype == np.uint8:
+        out[image == MISSING] = np.nan
+    return out
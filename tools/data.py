@@ -1,9 +1,15 @@
 import os
 import sys
 import time
+import calendar
+import threading
 
+import numpy as np
 from scipy.io import loadmat
 
+from tools import compact, profiling, store
+from tools.cache import GRANULE_CACHE
+
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 
@@ -19,6 +25,37 @@ INSTRUMENT_MAP = {
     "both": 2
 }
 
+# Bytes read from disk by mat_file, 'last' holds the count of the most recent
+# call. See io_stats().
+IO_STATS = {
+    'calls': 0,
+    'bytes_read': 0,
+    'last': 0,
+}
+_IO_LOCK = threading.Lock()
+
+
+class _CountingFile(object):
+    """
+        Thin wrapper around a file object that counts the bytes read through
+        it, loadmat only needs read, seek and tell.
+    """
+
+    def __init__(self, fileobj):
+        self._file = fileobj
+        self.bytes_read = 0
+
+    def read(self, *args):
+        chunk = self._file.read(*args)
+        self.bytes_read += len(chunk)
+        return chunk
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
 
 def mat_generator(file_list=[]):
     """
@@ -37,7 +74,7 @@ def mat_generator(file_list=[]):
             yield mat_file(os.path.join(DATA_DIR, f))
 
 
-def mat_file(filepath=None):
+def mat_file(filepath=None, variable_names=None):
     """
         Returns a dictionary whith the contents of the .mat file. This is an
         auxiliary function, that can be used outside data.py context.
@@ -45,6 +82,9 @@ def mat_file(filepath=None):
         :params:
             :param filepath: Set to None by default, contains the path where
                              where the mat file to be loaded is
+            :param variable_names: list of sensors to read, e.g. ['mw_sic'].
+                                   The data of every other variable is
+                                   skipped on disk. None reads everything.
 
         :rType: dict()
     """
@@ -54,9 +94,142 @@ def mat_file(filepath=None):
         sys.exit(1)
     else:
         try:
-            return loadmat(filepath)
+            with open(filepath, 'rb') as f:
+                stream = _CountingFile(f)
+                mat = loadmat(stream, variable_names=variable_names)
         except IOError, ioex:
             print "mat_file: {0}".format(os.strerror(ioex.errno))
+        else:
+            with _IO_LOCK:
+                IO_STATS['calls'] += 1
+                IO_STATS['bytes_read'] += stream.bytes_read
+                IO_STATS['last'] = stream.bytes_read
+            return mat
+
+
+def io_stats():
+    """
+        Returns how many bytes mat_file has read from disk: the total, the
+        number of calls and the bytes read by the last call.
+
+        :rType: dict()
+    """
+    with _IO_LOCK:
+        return dict(IO_STATS)
+
+
+def sensor(filepath, name):
+    """
+        Returns a single decoded sensor array from a .mat file. Granules that
+        have been converted with tools.ingest are memory mapped from the
+        store, otherwise only that variable is read from the .mat file and
+        kept in its compact type (see tools.compact). Arrays are kept in the
+        process-wide granule cache so asking again for the same sensor of the
+        same file doesn't decode the file again.
+
+        :params:
+            :param filepath: string with the path of the .mat file
+            :param name: string with the sensor name, e.g. mw_sic, lm, ibands
+
+        :rType: ndarray
+    """
+
+    if not filepath or not os.path.isfile(filepath):
+        print "Error: File {0} doesn't exist".format(filepath)
+        sys.exit(1)
+
+    return GRANULE_CACHE.get(filepath, name, lambda: _decode(filepath, name))
+
+
+def sensors(filepath, names):
+    """
+        Returns several sensors of a .mat file at once. The ones that aren't
+        cached or in the store are decoded with a single read of the file and
+        added to the granule cache, so the models built on top of the same
+        file afterwards don't decode it again.
+
+        :params:
+            :param filepath: string with the path of the .mat file
+            :param names: list of sensor names, e.g. ['mw_sic', 'lm']
+
+        :rType: dict()
+    """
+
+    if not filepath or not os.path.isfile(filepath):
+        print "Error: File {0} doesn't exist".format(filepath)
+        sys.exit(1)
+
+    out = dict()
+    for name in names:
+        image = GRANULE_CACHE.lookup(filepath, name)
+        if image is None:
+            image = store.open_sensor(filepath, name)
+        out[name] = image
+
+    missing = [name for name in names if out[name] is None]
+    if missing:
+        with profiling.stage('load', ",".join(missing)):
+            mat = mat_file(filepath, missing)
+            for name in missing:
+                out[name] = compact.pack(name, mat.get(name))
+
+    for name in names:
+        GRANULE_CACHE.put(GRANULE_CACHE.key(filepath, name), out.get(name))
+
+    return dict((name, out.get(name)) for name in names)
+
+
+def _decode(filepath, name):
+    with profiling.stage('load', name):
+        image = store.open_sensor(filepath, name)
+        if image is None:
+            image = compact.pack(name, mat_file(filepath, [name]).get(name))
+    return image
+
+
+def roi_index(roi=None):
+    """
+        Returns the index tuple for a region of interest of a (rows, cols) or
+        (bands, rows, cols) array.
+
+        :params:
+            :param roi: tuple (rows, cols), each one a slice or a (start, stop)
+                        tuple, e.g. ((2500, None), (2500, 3000)). None selects
+                        the whole image.
+
+        :rType: tuple
+    """
+    if roi is None:
+        return (Ellipsis,)
+
+    rows, cols = roi
+    if not isinstance(rows, slice):
+        rows = slice(*rows)
+    if not isinstance(cols, slice):
+        cols = slice(*cols)
+    return (Ellipsis, rows, cols)
+
+
+def window(image, roi=None):
+    """
+        Returns the region of interest of image as a new in memory array. On a
+        memory mapped image only the pages of the window are read. Without a
+        roi the image is returned as is.
+
+        :rType: ndarray
+    """
+    if roi is None or image is None:
+        return image
+    return np.array(image[roi_index(roi)])
+
+
+def release(filepath, name=None):
+    """
+        Drop the cached sensor arrays of a file, all of them when name is None.
+
+        :rType: int, number of bytes released
+    """
+    return GRANULE_CACHE.release(filepath, name)
 
 
 def file_names(instrument_id=2):
@@ -71,7 +244,7 @@ def file_names(instrument_id=2):
                                   constant/map.
     """
 
-    files = os.listdir(DATA_DIR)
+    files = [f for f in os.listdir(DATA_DIR) if f.endswith('.mat')]
 
     if instrument_id == 2:
         return sorted([f for f in files])
@@ -103,6 +276,94 @@ def parse_date(filename):
     )
 
 
+def timestamp(filename):
+    """
+        Acquisition time of a granule from its file name in seconds since the
+        epoch (UTC). Unlike parse_date it's a plain number that can be stored,
+        sorted and subtracted.
+
+        :rtype: float
+    """
+    return date_timestamp(filename[2:-13])
+
+
+def date_timestamp(date_str):
+    """
+        Convert a date in the file name format, 'YYYY_DDD' or 'YYYY_DDD_HHMM'
+        (e.g. 2015_336_0041), to seconds since the epoch (UTC).
+
+        :rtype: float
+    """
+    parts = date_str.split('_')
+    year, jday = int(parts[0]), int(parts[1])
+    hour = parts[2] if len(parts) > 2 else '0000'
+
+    start_of_year = calendar.timegm((year, 1, 1, 0, 0, 0))
+    return float(start_of_year + (jday - 1) * 86400 +
+                 int(hour[:2]) * 3600 + int(hour[2:]) * 60)
+
+
+def timestamps(files):
+    """
+        Vectorized timestamp, the acquisition time of every file name in
+        files.
+
+        :rtype: ndarray of float64
+    """
+    return np.array([timestamp(f) for f in files], dtype=np.float64)
+
+
+def temporal_join(left, right, interval, nearest=False):
+    """
+        Pair the granules of two lists of file names (e.g. VIRS and MODIS)
+        acquired at most interval minutes apart. The right side is sorted once
+        and every left granule finds its window with a binary search, so it
+        runs in O(n log n) plus the number of pairs.
+
+        :params:
+            :param left: list of file names
+            :param right: list of file names
+            :param interval: maximum time difference in minutes
+            :param nearest: only pair each left granule with its closest
+                            right granule instead of every one in the window,
+                            the earlier one when two are as close.
+
+        :return: (left file, right file) pairs in left acquisition order
+        :rtype: Generator
+    """
+
+    if not left or not right:
+        return
+
+    left_times = timestamps(left)
+    right_times = timestamps(right)
+    window = interval * 60.0
+
+    right_order = np.argsort(right_times, kind='mergesort')
+    right_times = right_times[right_order]
+
+    if nearest:
+        after = np.searchsorted(right_times, left_times)
+        before = np.clip(after - 1, 0, len(right_times) - 1)
+        after = np.clip(after, 0, len(right_times) - 1)
+
+        before_dist = np.abs(left_times - right_times[before])
+        after_dist = np.abs(right_times[after] - left_times)
+        closest = np.where(after_dist < before_dist, after, before)
+        distance = np.minimum(before_dist, after_dist)
+
+        for idx in np.argsort(left_times, kind='mergesort'):
+            if distance[idx] <= window:
+                yield left[idx], right[right_order[closest[idx]]]
+    else:
+        first = np.searchsorted(right_times, left_times - window, 'left')
+        last = np.searchsorted(right_times, left_times + window, 'right')
+
+        for idx in np.argsort(left_times, kind='mergesort'):
+            for pos in xrange(first[idx], last[idx]):
+                yield left[idx], right[right_order[pos]]
+
+
 def date_dff(date_a, date_b):
     """
         :params:
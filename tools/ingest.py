@@ -0,0 +1,100 @@
+# ============================================================================
+#
+#   Convert the .mat granules in the data directory into the per-sensor .npy
+#   store (see tools/store.py) so the image models can memory map them
+#   instead of decoding the .mat file on every run. Sensors are stored in
+#   their compact types (see tools/compact.py), convert with --force granules
+#   stored before as float64.
+#
+#       python -m tools.ingest -i vir
+#       python -m tools.ingest G_2015_336_0041_RS_N_VIR.mat --force
+#
+# ============================================================================
+
+import os
+import sys
+
+import argparse
+import numpy as np
+from scipy.io import whosmat
+
+from tools import compact, data, store, catalog
+
+# MATLAB classes loadmat decodes into object arrays, they aren't stored
+CONTAINER_CLASSES = ('cell', 'struct', 'object', 'function_handle')
+
+
+def convert(filepath, force=False):
+    """
+        Convert every sensor of a .mat file into the store. The sensors are
+        listed from the variable headers (whosmat) and only the ones that
+        aren't fresh in the store are decoded.
+
+        :params:
+            :param filepath: string with the path of the .mat file
+            :param force: convert again even if the store is up to date
+
+        :rType: list with the sensors that were written
+    """
+
+    if not os.path.isfile(filepath):
+        print "Error: File {0} doesn't exist".format(filepath)
+        sys.exit(1)
+
+    stale = [sensor for sensor, _, mat_class in whosmat(filepath)
+             if mat_class not in CONTAINER_CLASSES and
+             (force or not store.is_fresh(filepath, sensor))]
+    if not stale:
+        return []
+
+    mat = data.mat_file(filepath, variable_names=stale)
+    written = list()
+
+    for sensor, value in sorted(mat.items()):
+        # Skip loadmat's __header__, __version__ and __globals__, and
+        # anything that isn't a plain numeric array.
+        if sensor.startswith('__') or not isinstance(value, np.ndarray):
+            continue
+        if value.dtype == object:
+            continue
+        store.save_sensor(filepath, sensor, compact.pack(sensor, value))
+        written.append(sensor)
+
+    return written
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="Convert .mat granules into the memory mapped store")
+
+    parser.add_argument(
+        "files", nargs='*',
+        help="Granule file names, defaults to every file of the instrument")
+    parser.add_argument(
+        "--instrument", "-i", action='store', dest='instrument',
+        default='both', help="Instrument vir, mod or both")
+    parser.add_argument(
+        "--force", action='store_true', dest='force', default=False,
+        help="Convert again granules that are already in the store")
+
+    args = parser.parse_args()
+
+    files = args.files
+    if not files:
+        files = catalog.files(args.instrument)
+
+    if not files:
+        print "There are no files to be converted. Check file path"
+        sys.exit(1)
+
+    for f in files:
+        written = convert(os.path.join(data.DATA_DIR, f), force=args.force)
+        if written:
+            print "{0}: {1}".format(f, ", ".join(written))
+        else:
+            print "{0}: up to date".format(f)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# ============================================================================
+#
+#   Mini-batch k-means (Sculley, "Web-scale k-means clustering"). Every
+#   iteration moves the centroids towards the mean of a small random batch of
+#   points, so the cost of an iteration doesn't depend on the size of the
+#   scene. Labelling all the points is done in chunks whose distance matrix
+#   stays under a fixed number of bytes.
+#
+#       centroids = kmeans.minibatch(points, 3, seed=0)
+#       labels = kmeans.assign(points, centroids)
+#
+# ============================================================================
+
+import numpy as np
+
+BATCH_SIZE = 4096
+MAX_ITER = 200
+TOL = 1e-4
+
+# Points used to pick the initial centroids (k-means++)
+INIT_SIZE = 8192
+
+# Bytes of the distance matrix of one assignment chunk
+CHUNK_BYTES = 32 * 1024 * 1024
+
+
+def minibatch(points, k, batch_size=BATCH_SIZE, max_iter=MAX_ITER, tol=TOL,
+              seed=None):
+    """
+        Cluster points in k groups.
+
+        :params:
+            :param points: ndarray (n, features)
+            :param k: integer with the number of clusters
+            :param batch_size: integer with the points of each iteration
+            :param max_iter: integer with the maximum number of iterations
+            :param tol: stop when the squared distance moved by the centroids
+                        in an iteration is below tol times the variance of
+                        the points.
+            :param seed: integer seed of the random batches, the same seed
+                         and points always give the same centroids.
+
+        :rType: ndarray (k, features) with the centroids
+        :raises ValueError: when there are fewer points than clusters
+    """
+
+    points = _features(points)
+    n = len(points)
+    if n < k:
+        raise ValueError(
+            "Can't make {0} clusters out of {1} points".format(k, n))
+
+    rng = np.random.RandomState(seed)
+
+    sample = points[rng.randint(0, n, min(n, INIT_SIZE))].astype(np.float64)
+    centroids = _kmeans_plus_plus(sample, k, rng)
+    threshold = tol * sample.var(axis=0).sum()
+
+    counts = np.zeros(k)
+    for _ in xrange(max_iter):
+        batch = points[rng.randint(0, n, batch_size)].astype(np.float64)
+        labels = assign(batch, centroids)
+
+        # Each centroid is the mean of all the points it has been given so
+        # far, the step gets smaller as its count grows.
+        batch_counts = np.bincount(labels, minlength=k)
+        sums = np.column_stack(
+            [np.bincount(labels, weights=batch[:, f], minlength=k)
+             for f in xrange(batch.shape[1])])
+
+        seen = batch_counts > 0
+        counts[seen] += batch_counts[seen]
+        previous = centroids.copy()
+        centroids[seen] += ((sums[seen] -
+                             batch_counts[seen, None] * centroids[seen]) /
+                            counts[seen, None])
+
+        if ((centroids - previous) ** 2).sum() <= threshold:
+            break
+
+    return centroids
+
+
+def assign(points, centroids, chunk_bytes=CHUNK_BYTES):
+    """
+        Label of the nearest centroid of each point, same as the first value
+        of scipy.cluster.vq.vq, computed in chunks of points so the memory
+        used doesn't grow with the number of points.
+
+        :params:
+            :param points: ndarray (n, features)
+            :param centroids: ndarray (k, features)
+            :param chunk_bytes: integer with the bytes of a chunk and its
+                                distance matrix.
+
+        :rType: ndarray
+    """
+
+    points = _features(points)
+    centroids = np.asarray(centroids, dtype=np.float64)
+    k = len(centroids)
+
+    rows = max(1, chunk_bytes // (8 * (k + points.shape[1])))
+    labels = np.empty(len(points), dtype=np.uint8 if k <= 256 else np.intp)
+    norms = (centroids ** 2).sum(axis=1)
+
+    for start in xrange(0, len(points), rows):
+        chunk = points[start:start + rows].astype(np.float64)
+
+        # |x - c|^2 = |x|^2 - 2 x.c + |c|^2, |x|^2 doesn't change the nearest
+        distances = norms - 2 * np.dot(chunk, centroids.T)
+        labels[start:start + rows] = distances.argmin(axis=1)
+
+    return labels
+
+
+def _kmeans_plus_plus(sample, k, rng):
+    """
+        k-means++ seeding: each centroid is drawn with probability
+        proportional to the squared distance to the nearest one already
+        chosen.
+    """
+    centroids = np.empty((k, sample.shape[1]))
+    centroids[0] = sample[rng.randint(len(sample))]
+    closest = ((sample - centroids[0]) ** 2).sum(axis=1)
+
+    for i in xrange(1, k):
+        total = closest.sum()
+        if total > 0:
+            index = np.searchsorted(np.cumsum(closest), rng.rand() * total)
+            index = min(index, len(sample) - 1)
+        else:
+            index = rng.randint(len(sample))
+        centroids[i] = sample[index]
+        closest = np.minimum(closest,
+                             ((sample - centroids[i]) ** 2).sum(axis=1))
+
+    return centroids
+
+
+def _features(points):
+    points = np.asarray(points)
+    if points.ndim == 1:
+        points = points[:, np.newaxis]
+    return points
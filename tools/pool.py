@@ -0,0 +1,45 @@
+from multiprocessing import Pool
+
+
+def imap_granules(func, files, workers=1):
+    """
+        Apply func to every file name in files, yielding the results as they
+        are ready in the same order as files. With more than one worker the
+        calls are spread across a process pool, func has to be a module level
+        function (or a functools.partial of one) so it can be pickled.
+
+        :params:
+            :param func: callable taking a single file name
+            :param files: list of file names
+            :param workers: integer with the number of processes to use, 1 (or
+                            None) runs everything in this process.
+
+        :rType: Generator
+    """
+
+    if not workers or workers <= 1 or len(files) <= 1:
+        for f in files:
+            yield func(f)
+        return
+
+    workers = min(workers, len(files))
+    chunksize = max(1, len(files) // (workers * 4))
+
+    pool = Pool(processes=workers)
+    try:
+        for result in pool.imap(func, files, chunksize):
+            yield result
+    finally:
+        # Also reached when the caller stops iterating early, don't leave
+        # workers computing granules nobody is going to read.
+        pool.terminate()
+        pool.join()
+
+
+def map_granules(func, files, workers=1):
+    """
+        Same as imap_granules but returns all the results in a list.
+
+        :rType: list
+    """
+    return list(imap_granules(func, files, workers))
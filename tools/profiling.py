@@ -0,0 +1,149 @@
+# ============================================================================
+#
+#   Per-stage instrumentation for --profile. Code is split in stages:
+#
+#       load    decoding a sensor (tools.data)
+#       model   a method of an image model (app.models)
+#       report  a report of app.py
+#       render  drawing and saving or showing figures (tools.render)
+#
+#   and each stage records the wall time, number of calls, bytes decoded
+#   from .mat files and the peak resident memory of the process. Stages nest
+#   (a report calls model methods that load sensors) so times are inclusive.
+#   Nothing is recorded until enable() is called, a disabled stage costs a
+#   flag check. Only this process is recorded, granules computed by --workers
+#   processes show up as the report or render that waited for them.
+#
+#       @profiling.timed('report')
+#       def sic_report(...):
+#
+#       with profiling.stage('load', 'mw_sic'):
+#           ...
+#
+# ============================================================================
+
+import sys
+import json
+import atexit
+import resource
+import functools
+import threading
+from timeit import default_timer
+from contextlib import contextmanager
+from collections import OrderedDict
+
+STAGES = ('load', 'model', 'report', 'render')
+
+ENABLED = False
+
+# (stage, name) -> dict(calls, seconds, bytes, peak_rss_kb)
+RECORDS = OrderedDict()
+_LOCK = threading.Lock()
+
+
+def enable(path=None):
+    """
+        Start recording, the summary is printed at exit and also written as
+        JSON to path when given.
+    """
+    global ENABLED
+    ENABLED = True
+    atexit.register(summary, path)
+
+
+def _bytes_read():
+    # tools.data imports this module, import it when it's used
+    from tools import data
+    return data.IO_STATS['bytes_read']
+
+
+def _peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+@contextmanager
+def stage(kind, name):
+    """
+        Record the code in the with block as name in the kind stage.
+    """
+    if not ENABLED:
+        yield
+        return
+
+    start_bytes = _bytes_read()
+    start = default_timer()
+    try:
+        yield
+    finally:
+        seconds = default_timer() - start
+        decoded = _bytes_read() - start_bytes
+        record(kind, name, seconds, decoded)
+
+
+def record(kind, name, seconds, decoded=0):
+    peak = _peak_rss_kb()
+    with _LOCK:
+        entry = RECORDS.setdefault((kind, name), {
+            'calls': 0, 'seconds': 0.0, 'bytes': 0, 'peak_rss_kb': 0})
+        entry['calls'] += 1
+        entry['seconds'] += seconds
+        entry['bytes'] += decoded
+        entry['peak_rss_kb'] = max(entry['peak_rss_kb'], peak)
+
+
+def timed(kind, method=False):
+    """
+        Decorator recording every call of a function in the kind stage, under
+        the function name or, for methods, Class.method.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+
+            if method:
+                name = "{0}.{1}".format(type(args[0]).__name__, func.__name__)
+            else:
+                name = func.__name__
+
+            with stage(kind, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def model(func):
+    """
+        timed('model') for the methods of the image models.
+    """
+    return timed('model', method=True)(func)
+
+
+def summary(path=None, out=sys.stdout):
+    """
+        Print the recorded stages as a table, and save them as JSON in path.
+    """
+
+    with _LOCK:
+        rows = sorted(RECORDS.iteritems(),
+                      key=lambda item: (STAGES.index(item[0][0])
+                                        if item[0][0] in STAGES
+                                        else len(STAGES), -item[1]['seconds']))
+
+    out.write("\n{0:<8} {1:<36} {2:>7} {3:>10} {4:>12} {5:>12}\n".format(
+        "stage", "name", "calls", "seconds", "MiB decoded", "peak RSS MiB"))
+    for (kind, name), entry in rows:
+        out.write("{0:<8} {1:<36} {2:>7} {3:>10.3f} {4:>12.1f} "
+                  "{5:>12.1f}\n".format(kind, name[:36], entry['calls'],
+                                        entry['seconds'],
+                                        entry['bytes'] / 2.0 ** 20,
+                                        entry['peak_rss_kb'] / 1024.0))
+    out.write("Times are inclusive, a report includes its loads and "
+              "renders.\n")
+
+    if path:
+        with open(path, 'w') as f:
+            json.dump([dict(entry, stage=kind, name=name)
+                       for (kind, name), entry in rows], f, indent=2)
+        out.write("Profile saved in {0}\n".format(path))
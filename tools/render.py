@@ -0,0 +1,216 @@
+# ============================================================================
+#
+#   Where report figures go. By default every report opens a window with
+#   plt.show(), after configure(directory) they are rendered on the Agg
+#   (non-interactive) backend and saved as PNG/PDF files instead:
+#
+#       render.configure('out', fmt='pdf')
+#       fig, axes = render.subplots(1, 2)
+#       render.imshow(axes[0], image)
+#       render.show('overlap_2015_336_0041')    # -> out/overlap_...pdf
+#
+#   render.captured() keeps the figures shown inside a with block in memory,
+#   for callers that send them somewhere else (see app/service.py).
+#
+#   In file mode every report in the process draws on the same figure, which
+#   is cleared instead of creating a new one, and rasters are downsampled to
+#   the figure resolution before imshow.
+#
+# ============================================================================
+
+import os
+import math
+import functools
+from io import BytesIO
+from contextlib import contextmanager
+
+import numpy as np
+from matplotlib import pyplot as plt
+
+from tools import pool, profiling
+
+# Number of the figure reused by every report in file mode
+FIGURE_NUM = 1
+
+SETTINGS = {
+    'directory': None,
+    'format': 'png',
+    'dpi': 100,
+    # list the figures are appended to inside captured()
+    'capture': None,
+}
+
+
+def configure(directory=None, fmt='png', dpi=100):
+    """
+        Render figures into files instead of showing them.
+
+        :params:
+            :param directory: string with the output directory, None goes
+                              back to showing figures in a window.
+            :param fmt: string with the file format, png or pdf
+            :param dpi: integer with the resolution of the files
+    """
+    SETTINGS['directory'] = directory
+    SETTINGS['format'] = fmt
+    SETTINGS['dpi'] = dpi
+
+    if directory is not None:
+        plt.switch_backend('Agg')
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+
+def headless():
+    return SETTINGS['directory'] is not None or SETTINGS['capture'] is not None
+
+
+@contextmanager
+def captured(fmt='png'):
+    """
+        Figures shown inside the with block are kept in memory, as the bytes
+        of fmt files, instead of being shown or saved. Figures are shared by
+        the whole process so callers in threads have to serialize the block.
+
+            with render.captured() as images:
+                report(...)
+
+        :rType: list of strings, one per figure shown
+    """
+    previous = SETTINGS['capture'], SETTINGS['format']
+    if plt.get_backend().lower() != 'agg':
+        plt.switch_backend('Agg')
+
+    SETTINGS['capture'], SETTINGS['format'] = [], fmt
+    try:
+        yield SETTINGS['capture']
+    finally:
+        SETTINGS['capture'], SETTINGS['format'] = previous
+
+
+def figure():
+    """
+        Returns the figure a report should draw on. In file mode it's the
+        shared figure, cleared.
+
+        :rType: matplotlib.figure.Figure
+    """
+    if not headless():
+        return plt.figure()
+
+    fig = plt.figure(FIGURE_NUM)
+    fig.clf()
+    fig.set_size_inches(plt.rcParams['figure.figsize'])
+    return fig
+
+
+def subplots(nrows=1, ncols=1, sharex=False, sharey=False):
+    """
+        Same as plt.subplots (with squeeze) drawing on figure().
+
+        :rType: tuple (figure, axes)
+    """
+    if not headless():
+        return plt.subplots(nrows, ncols, sharex=sharex, sharey=sharey)
+
+    fig = figure()
+    axes = np.empty((nrows, ncols), dtype=object)
+
+    for row in range(nrows):
+        for col in range(ncols):
+            first = axes[0, 0] if (row or col) else None
+            axes[row, col] = fig.add_subplot(
+                nrows, ncols, row * ncols + col + 1,
+                sharex=first if sharex else None,
+                sharey=first if sharey else None)
+
+    if axes.size == 1:
+        return fig, axes[0, 0]
+    if nrows == 1 or ncols == 1:
+        return fig, axes.ravel()
+    return fig, axes
+
+
+@profiling.timed('render')
+def imshow(target, image, **kwargs):
+    """
+        target.imshow(image), target being pyplot or an axes. In file mode
+        the image is first downsampled to the resolution of the figure.
+
+        :rType: matplotlib.image.AxesImage
+    """
+    if headless():
+        width, height = plt.gcf().get_size_inches() * SETTINGS['dpi']
+        rows, cols = image.shape[:2]
+        image = downsample(image, int(max(width, height)))
+
+        # keep the axes in the pixel coordinates of the full image
+        if image.shape[0] != rows and 'extent' not in kwargs:
+            kwargs['extent'] = (-0.5, cols - 0.5, rows - 0.5, -0.5)
+    return target.imshow(image, **kwargs)
+
+
+def downsample(image, size):
+    """
+        Stride image (rows, cols[, channels]) so neither side is larger than
+        size pixels. Returns a view, nothing is copied.
+
+        :rType: ndarray
+    """
+    step = int(math.ceil(max(image.shape[:2]) / float(size)))
+    if step <= 1:
+        return image
+    return image[::step, ::step]
+
+
+@profiling.timed('render')
+def show(name):
+    """
+        Show the current figure or, in file mode, save it as
+        <directory>/<name>.<format> and clear it for the next report. Inside
+        captured() the figure is kept in memory instead.
+
+        :rType: string with the path of the file, None when shown or captured
+    """
+    if not headless():
+        plt.show()
+        return None
+
+    fig = plt.gcf()
+    if SETTINGS['capture'] is not None:
+        path = None
+        image = BytesIO()
+        fig.savefig(image, format=SETTINGS['format'], dpi=SETTINGS['dpi'])
+        SETTINGS['capture'].append(image.getvalue())
+    else:
+        path = os.path.join(
+            SETTINGS['directory'], "{0}.{1}".format(name, SETTINGS['format']))
+        fig.savefig(path, dpi=SETTINGS['dpi'])
+
+    # Figures created outside figure()/subplots() (pandas, plt.figure) are
+    # closed, the shared one is only cleared.
+    if fig.number == FIGURE_NUM:
+        fig.clf()
+    else:
+        plt.close(fig)
+
+    return path
+
+
+def render_granules(func, files, workers=1):
+    """
+        Run a per-granule report, a function of the granule file name, for
+        every file in files, spread across workers processes. A failing
+        granule doesn't stop the others.
+
+        :rType: list of (filename, error) tuples, error is None on success
+    """
+    return pool.map_granules(functools.partial(_render, func), files, workers)
+
+
+def _render(func, filename):
+    try:
+        func(filename)
+    except (Exception, SystemExit), ex:
+        return filename, "{0}: {1}".format(type(ex).__name__, ex)
+    return filename, None
@@ -0,0 +1,119 @@
+# ============================================================================
+#
+#   Products derived from static layers (the land mask is the same grid in
+#   every granule) memoized by the content hash of the layer, in memory and
+#   on disk under data/store/static/<digest>/<product>.npy. A layer whose
+#   contents change gets a new digest, so stale products are never used.
+#
+#       key = static.digest(lm.compact())
+#       border = static.derived(key, 'silhoutte', lambda: expensive(lm))
+#
+# ============================================================================
+
+import os
+import hashlib
+import tempfile
+import threading
+
+import numpy as np
+
+from tools import data, store
+
+STATIC_DIRNAME = 'static'
+
+_MEMORY = dict()
+_LOCK = threading.Lock()
+
+# (key, product) -> lock held while the product is loaded or computed
+_PRODUCT_LOCKS = dict()
+
+
+def digest(image):
+    """
+        Content hash of an array, its type and shape are part of it.
+
+        :rType: string
+    """
+    image = np.ascontiguousarray(image)
+    sha = hashlib.sha1("{0}{1}".format(image.dtype.str, image.shape))
+    sha.update(image.view(np.uint8))
+    return sha.hexdigest()
+
+
+def product_path(key, product):
+    return os.path.join(data.DATA_DIR, store.STORE_DIRNAME, STATIC_DIRNAME,
+                        key, "{0}.npy".format(product))
+
+
+def derived(key, product, compute):
+    """
+        Returns a product of the layer with digest key, computing it only if
+        it's neither in memory nor on disk. Arrays are returned read only
+        since they are shared.
+
+        :params:
+            :param key: string with the digest of the layer, see digest()
+            :param product: string with the name of the product
+            :param compute: callable with no arguments returning the product,
+                            an ndarray or a number.
+
+        Threads asking for the same product wait for the first one, so each
+        product is computed once per process.
+    """
+
+    with _LOCK:
+        if (key, product) in _MEMORY:
+            return _MEMORY[(key, product)]
+        lock = _PRODUCT_LOCKS.setdefault((key, product), threading.Lock())
+
+    with lock:
+        with _LOCK:
+            if (key, product) in _MEMORY:
+                return _MEMORY[(key, product)]
+
+        path = product_path(key, product)
+        if os.path.isfile(path):
+            value = np.load(path)
+        else:
+            value = np.asarray(compute())
+            _save(path, value)
+
+        if value.ndim == 0:
+            value = value.item()
+        else:
+            value.flags.writeable = False
+
+        with _LOCK:
+            _MEMORY[(key, product)] = value
+        return value
+
+
+def clear():
+    """
+        Forget the products kept in memory, the ones on disk stay.
+    """
+    with _LOCK:
+        _MEMORY.clear()
+
+
+def _save(path, value):
+    """
+        Write value under a temporary name of its own and rename it into
+        place, other threads and processes saving the same product never
+        share the file.
+    """
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory)
+    except OSError:
+        if not os.path.isdir(directory):
+            raise
+
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, value)
+        os.rename(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
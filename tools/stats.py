@@ -0,0 +1,176 @@
+# ============================================================================
+#
+#   Pixel class counts of the ice, land and NaN masks, computed in a single
+#   pass with explicit zeros for the classes a granule does not have:
+#
+#       counts = stats.class_counts(ice=sic > 40, land=lm == 1)
+#       stats.percentage(counts['overlap'], counts['land'])
+#
+#   mask_counts gives the same counts from packed masks (tools/bitmask.py).
+#
+# ============================================================================
+
+import numpy as np
+
+# Bits of the class code of a pixel, see class_counts
+ICE_BIT = 1
+LAND_BIT = 2
+NAN_BIT = 4
+
+
+def class_counts(ice=None, land=None, nan=None):
+    """
+        Counts the pixels of every ice/land class in one linear pass. Each
+        pixel is encoded as a small integer (ice | land << 1 | nan << 2) and
+        the codes are counted with np.bincount, so classes that are absent
+        count 0 instead of missing like with itemfreq.
+
+        :params:
+            :param ice: boolean ndarray where there is sea ice
+            :param land: boolean ndarray where there is land (the land mask or
+                         its border), same shape as ice
+            :param nan: boolean ndarray of the NaN pixels, same shape as ice
+
+        :return: dict() with the number of pixels:
+                    - total
+                    - ice: with ice
+                    - land: with land
+                    - overlap: with ice and land
+                    - other: with neither ice nor land (NaN included)
+                    - nan: NaN
+        :rType: dict()
+        :raises ValueError: when no mask is given
+    """
+
+    masks = [(ICE_BIT, ice), (LAND_BIT, land), (NAN_BIT, nan)]
+    given = [m for _, m in masks if m is not None]
+    if not given:
+        raise ValueError("class_counts needs at least one mask")
+    shape = given[0].shape
+
+    codes = np.zeros(shape, dtype=np.uint8)
+    for bit, mask in masks:
+        if mask is None:
+            continue
+        mask = np.asarray(mask, dtype=bool).view(np.uint8)
+        codes |= mask if bit == 1 else mask * np.uint8(bit)
+
+    counts = np.bincount(codes.ravel(), minlength=8)
+    code = np.arange(8)
+
+    def total(selected):
+        return int(counts[selected].sum())
+
+    return {
+        'total': int(codes.size),
+        'ice': total((code & ICE_BIT) > 0),
+        'land': total((code & LAND_BIT) > 0),
+        'overlap': total((code & (ICE_BIT | LAND_BIT)) ==
+                         (ICE_BIT | LAND_BIT)),
+        'other': total((code & (ICE_BIT | LAND_BIT)) == 0),
+        'nan': total((code & NAN_BIT) > 0),
+    }
+
+
+def mask_counts(ice=None, land=None, nan=None):
+    """
+        Same counts as class_counts from packed masks, with popcounts of
+        their intersections instead of a raster of class codes.
+
+        :params:
+            :param ice: BitMask where there is sea ice
+            :param land: BitMask where there is land (or its border), same
+                         shape as ice
+            :param nan: BitMask of the NaN pixels, same shape as ice
+        :rType: dict()
+        :raises ValueError: when no mask is given
+    """
+
+    masks = [m for m in (ice, land, nan) if m is not None]
+    if not masks:
+        raise ValueError("mask_counts needs at least one mask")
+    total = masks[0].size
+
+    def count(mask):
+        return 0 if mask is None else mask.count()
+
+    ice_count, land_count = count(ice), count(land)
+    overlap = 0
+    if ice is not None and land is not None:
+        overlap = count(ice & land)
+
+    return {
+        'total': total,
+        'ice': ice_count,
+        'land': land_count,
+        'overlap': overlap,
+        'other': total - (ice_count + land_count - overlap),
+        'nan': count(nan),
+    }
+
+
+def percentage(count, total):
+    """
+        count as a percentage of total, 0 when total is 0.
+
+        :rType: float
+    """
+    if not total:
+        return 0.0
+    return (float(count) / total) * 100
+
+
+# ====================================================================
+#                    Sea Ice Concentration Histogram
+# ====================================================================
+
+# Bin i counts the pixels with ceil(concentration) == i, 0 to 100 plus one
+# bin for anything above 100
+CONCENTRATION_BINS = 102
+
+
+def concentration_histogram(image):
+    """
+        Histogram of a sea ice concentration image. Binning by the ceiling
+        makes "concentration > level" the same as "bin > level" for integer
+        levels, so the extent at any level comes from the histogram alone.
+        Negative values go to bin 0 and NaN pixels aren't counted. uint8
+        images (see tools.compact) are counted as they are, their missing
+        value falls outside the bins.
+
+        :params:
+            :param image: ndarray with sea ice concentrations (0 - 100)
+        :rType: ndarray
+    """
+    if image.dtype == np.uint8:
+        counts = np.bincount(image.ravel(), minlength=256)
+        return counts[:CONCENTRATION_BINS]
+
+    valid = image[~np.isnan(image)]
+    bins = np.clip(np.ceil(valid), 0, CONCENTRATION_BINS - 1)
+    return np.bincount(bins.astype(np.intp), minlength=CONCENTRATION_BINS)
+
+
+def exceedance(histogram, total, levels):
+    """
+        Percentage of total pixels with a concentration above each level.
+
+        :params:
+            :param histogram: ndarray from concentration_histogram
+            :param total: integer with the number of pixels of the image, NaN
+                          included like in SICImage.percentage
+            :param levels: integer levels between 0 and 100
+        :rType: dict() level -> percentage
+        :raises ValueError: for levels that aren't integers between 0 and 100
+    """
+
+    # above[i] is the number of pixels in bin i or higher
+    above = np.cumsum(histogram[::-1])[::-1]
+
+    extent = dict()
+    for level in levels:
+        if level != int(level) or not 0 <= level <= 100:
+            raise ValueError("Extent levels must be integers between 0 and "
+                             "100, not {0}".format(level))
+        extent[level] = percentage(above[int(level) + 1], total)
+    return extent
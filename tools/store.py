@@ -0,0 +1,86 @@
+import os
+import tempfile
+
+import numpy as np
+
+# Converted granules live next to the .mat files, one directory per granule
+# and one .npy file per sensor:
+#
+#     data/store/G_2015_336_0041_RS_N_VIR/mw_sic.npy
+#
+# The granule catalog (tools/catalog.py) is kept in the same directory.
+STORE_DIRNAME = 'store'
+
+
+def granule_dir(filepath):
+    """
+        Returns the store directory of the .mat file in filepath.
+
+        :rType: string
+    """
+    root, name = os.path.split(os.path.abspath(filepath))
+    return os.path.join(root, STORE_DIRNAME, os.path.splitext(name)[0])
+
+
+def sensor_path(filepath, sensor):
+    """
+        Returns the path of the .npy file of sensor for the .mat file in
+        filepath, whether it has been converted or not.
+
+        :rType: string
+    """
+    return os.path.join(granule_dir(filepath), "{0}.npy".format(sensor))
+
+
+def is_fresh(filepath, sensor):
+    """
+        True when sensor has been converted and the .npy file is not older
+        than the .mat file it came from.
+
+        :rType: bool
+    """
+    path = sensor_path(filepath, sensor)
+    return (os.path.isfile(path) and
+            os.path.getmtime(path) >= os.path.getmtime(filepath))
+
+
+def open_sensor(filepath, sensor):
+    """
+        Returns the converted sensor of the .mat file in filepath as a read
+        only memory map, or None if the granule hasn't been converted (or the
+        conversion is stale) so the caller can fall back to loadmat.
+
+        :rType: np.memmap or None
+    """
+    if not is_fresh(filepath, sensor):
+        return None
+    return np.load(sensor_path(filepath, sensor), mmap_mode='r')
+
+
+def save_sensor(filepath, sensor, array):
+    """
+        Write array as the converted sensor of the .mat file in filepath. The
+        file is written under a temporary name and renamed into place so
+        readers never open a half written array.
+
+        :rType: string, path of the .npy file
+    """
+    path = sensor_path(filepath, sensor)
+    directory = os.path.dirname(path)
+
+    try:
+        os.makedirs(directory)
+    except OSError:
+        if not os.path.isdir(directory):
+            raise
+
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.rename(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return path
@@ -0,0 +1,83 @@
+# ============================================================================
+#
+#   Tiled edge filtering. The raster is split into bands of rows, each one
+#   read with a one-pixel halo above and below, filtered on a thread pool and
+#   stitched back. The Sobel kernels are 3x3 so the halo is all a tile needs
+#   to give exactly the same values as filtering the whole scene at once.
+#
+# ============================================================================
+
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+from scipy.ndimage import filters, sobel
+
+# Rows per tile and the one-pixel halo of the 3x3 Sobel kernels
+TILE_ROWS = 512
+HALO = 1
+
+
+def edge_dtype(dtype):
+    """
+        Output type of the Laplace of Sobel for an input type. Boolean masks
+        give integers between -8 and 8 so they fit in int8 instead of float64,
+        byte sized integers (0-255 times 8) fit in int16, anything else keeps
+        its type like generic_laplace does.
+
+        :rType: np.dtype
+    """
+    dtype = np.dtype(dtype)
+    if dtype == np.bool_:
+        return np.dtype(np.int8)
+    if dtype.kind in 'iu' and dtype.itemsize == 1:
+        return np.dtype(np.int16)
+    return dtype
+
+
+def laplace_sobel(image, tile_rows=TILE_ROWS, workers=None):
+    """
+        Same as filters.generic_laplace(image, sobel, output=edge_dtype(..))
+        computed tile by tile on a thread pool, the result is bit-identical to
+        filtering the whole scene.
+
+        :params:
+            :param image: 2-D ndarray, usually a boolean or 0/1 mask
+            :param tile_rows: integer with the number of rows per tile
+            :param workers: integer with the number of threads, defaults to
+                            the number of CPUs.
+
+        :rType: ndarray
+    """
+
+    dtype = edge_dtype(image.dtype)
+    rows = image.shape[0]
+
+    if rows <= tile_rows:
+        return filters.generic_laplace(image, sobel, output=dtype)
+
+    output = np.empty(image.shape, dtype=dtype)
+
+    def run(start):
+        stop = min(start + tile_rows, rows)
+        low = max(start - HALO, 0)
+        high = min(stop + HALO, rows)
+
+        tile = filters.generic_laplace(image[low:high], sobel, output=dtype)
+        output[start:stop] = tile[start - low:stop - low]
+
+    workers = workers or multiprocessing.cpu_count()
+    starts = range(0, rows, tile_rows)
+
+    if workers <= 1:
+        for start in starts:
+            run(start)
+    else:
+        pool = ThreadPool(min(workers, len(starts)))
+        try:
+            pool.map(run, starts)
+        finally:
+            pool.close()
+            pool.join()
+
+    return output